@@ -1,18 +1,97 @@
 ## Importing libraries and files
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
 print("GEMINI_API_KEY loaded:", os.getenv("GEMINI_API_KEY") is not None)
 
 from crewai import Agent, LLM
-from tools import search_tool, FinancialDocumentTool ,FinancialDocumentTool, InvestmentTool, RiskTool  # added
+from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+from tools import DocumentSearchTool, InvestmentTool, RiskTool  # added
+from ratelimit import llm_limiter, estimate_tokens, RateLimitCancelled
+from llm_cache import llm_cache, completion_key, prompt_upload_path
+from documents import document_cache
+from telemetry import record_llm_call
 
-# Use CrewAI's built-in LLM class for Gemini
-llm = LLM(
-    model="gemini/gemini-2.0-flash",
-    temperature=0.3,  # Lower temperature for more consistent outputs
-)
+# Answer of an LLM whose request was cancelled: it ends the agent's loop at once. Raising instead
+# would leave crewai's async task future unresolved and the kickoff thread blocked on it for good.
+CANCELLED_ANSWER = "Thought: The analysis was cancelled.\nFinal Answer: Analysis cancelled."
+
+class RateLimitedLLM(LLM):
+    """LLM whose calls draw from the process-wide llm_limiter buckets.
+
+    Every agent shares this limiter, so concurrent requests (and other worker
+    processes) queue for quota instead of each agent counting its own max_rpm.
+    Completions are looked up in the shared llm_cache first, so a prompt seen
+    before (a retry, a re-run, an identical tool observation) costs no quota.
+    """
+
+    def __init__(self, *args, agent_label: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Label of the agent this instance serves, used for per-agent call/token metrics
+        self.agent_label = agent_label
+        # ProgressStream of the request currently using this LLM, set while streaming
+        self.progress = None
+        # Set for requests that asked for a fresh analysis (force_refresh)
+        self.bypass_cache = False
+        # threading.Event set once the request using this LLM is cancelled
+        self.cancel_event = None
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return CANCELLED_ANSWER
+        key = upload_path = None
+        if llm_cache.enabled:
+            upload_path = prompt_upload_path(messages)
+            upload = None
+            if upload_path is not None and os.path.exists(upload_path):
+                upload = (upload_path, document_cache.digest_for(upload_path))
+            key = completion_key(self.model, self.temperature, messages, tools, upload)
+            cached = None if self.bypass_cache else llm_cache.get(key, upload_path)
+            if cached is not None:
+                if self.progress is not None:
+                    self.progress.llm_started(self.agent_label)
+                    self.progress.llm_chunk(self.agent_label, cached)
+                return cached
+
+        estimated = estimate_tokens(messages)
+        try:
+            waited = llm_limiter.acquire(estimated, self.cancel_event)
+        except RateLimitCancelled:
+            return CANCELLED_ANSWER
+        if self.progress is not None:
+            self.progress.llm_started(self.agent_label)
+        start = time.perf_counter()
+        completion_tokens = 0
+        outcome = "error"
+        try:
+            response = super().call(messages, tools, callbacks, available_functions)
+            completion_tokens = estimate_tokens(str(response))
+            outcome = "success"
+        finally:
+            record_llm_call(self.agent_label, time.perf_counter() - start, waited,
+                            estimated, completion_tokens, outcome)
+        llm_limiter.settle(estimated, estimated + completion_tokens)
+        # Only plain-text completions are replayable; native tool calls are not cached
+        if key is not None and isinstance(response, str) and response.strip():
+            llm_cache.put(key, self.model, response, upload_path)
+        return response
+
+@crewai_event_bus.on(LLMStreamChunkEvent)
+def forward_stream_chunk(source, event):
+    """Relay streamed completion text to the request whose crew owns the LLM"""
+    progress = getattr(source, "progress", None)
+    if progress is not None and event.tool_call is None:
+        progress.llm_chunk(source.agent_label, event.chunk)
+
+def build_llm(agent_label: str) -> RateLimitedLLM:
+    """Use CrewAI's built-in LLM class for Gemini, one instance per agent so metrics carry its label"""
+    return RateLimitedLLM(
+        model="gemini/gemini-2.0-flash",
+        temperature=0.3,  # Lower temperature for more consistent outputs
+        agent_label=agent_label,
+    )
 
 # Creating an Experienced Financial Analyst agent
 financial_analyst = Agent(
@@ -27,10 +106,9 @@ financial_analyst = Agent(
         "You provide insights like you're explaining to an intelligent investor, not dumping raw data. "
         "You write in a conversational but professional tone, highlighting key findings and their implications."
     ),
-    tools=[FinancialDocumentTool(), InvestmentTool(), RiskTool()],
-    llm=llm,
+    tools=[DocumentSearchTool(), InvestmentTool(), RiskTool()],
+    llm=build_llm("financial_analyst"),
     max_iter=5,  # Increased from 3
-    max_rpm=10,  # Increased from 3
     allow_delegation=True
 )
 
@@ -45,9 +123,8 @@ verifier = Agent(
         "You provide brief, clear summaries of what type of document it is and whether it's suitable for analysis. "
         "You communicate in simple, direct language."
     ),
-    llm=llm,
+    llm=build_llm("verifier"),
     max_iter=2,  # Keep low for simple verification
-    max_rpm=5,   # Moderate for verification
     allow_delegation=True
 )
 
@@ -62,9 +139,8 @@ investment_advisor = Agent(
         "You write like you're having a conversation with a client, explaining your reasoning clearly. "
         "You always consider risk and provide balanced perspectives."
     ),
-    llm=llm,
+    llm=build_llm("investment_advisor"),
     max_iter=4,  # Moderate for advisory
-    max_rpm=8,   # Higher for complex analysis
     allow_delegation=False
 )
 
@@ -79,8 +155,7 @@ risk_assessor = Agent(
         "You write clear explanations of risk factors and practical mitigation strategies. "
         "You communicate risk levels and their implications in language that anyone can understand."
     ),
-    llm=llm,
+    llm=build_llm("risk_assessor"),
     max_iter=4,  # Moderate for risk analysis
-    max_rpm=8,   # Higher for thorough analysis
     allow_delegation=False
 )
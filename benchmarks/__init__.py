@@ -0,0 +1 @@
+"""Offline performance tooling: synthetic corpora and micro-benchmarks."""
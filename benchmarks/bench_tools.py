@@ -0,0 +1,168 @@
+"""Micro-benchmarks for the CPU-bound tool pipeline.
+
+Generates synthetic filings offline, times each tool's _run (cold: parse
+caches emptied; warm: document already cached), the individual stages
+(PDF loading, normalization, extraction) and peak Python memory, and writes
+the results as JSON.
+
+Usage (from the repository root, no network or API keys needed):
+
+    python -m benchmarks.bench_tools --output bench.json
+    python -m benchmarks.bench_tools --sizes 5 50 --compare bench.json
+"""
+import os
+
+# Keep the run offline: no telemetry from crewai imports
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.synthetic_pdf import EXPECTED_METRICS, EXPECTED_KEYWORDS, write_synthetic_filing
+from pdf_extraction import iter_pdf_pages, normalize_page
+from tools import (
+    FinancialDocumentTool, InvestmentTool, RiskTool,
+    document_cache, extraction_engine,
+)
+
+DEFAULT_SIZES = (5, 50, 500)
+
+def reset_caches():
+    document_cache.clear()
+    extraction_engine.clear()
+
+def measure(fn, repeat: int, cold: bool) -> dict:
+    """Median/min wall time of fn over repeat runs, plus peak traced memory of one more run"""
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            reset_caches()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    # Traced separately: tracemalloc slows allocation-heavy code several-fold
+    if cold:
+        reset_caches()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "median_s": round(statistics.median(timings), 6),
+        "min_s": round(min(timings), 6),
+        "peak_mem_bytes": peak,
+    }
+
+def check_outputs(path: str) -> None:
+    """Fail loudly if the tools no longer find the figures planted in the corpus"""
+    reset_caches()
+    extraction = extraction_engine.extract_document(document_cache.get(path))
+    found = {name: match.value for name, match in extraction.metrics.items()}
+    if found != EXPECTED_METRICS:
+        raise SystemExit(f"Unexpected metrics for {path}: {found}")
+    for group, keywords in EXPECTED_KEYWORDS.items():
+        if list(extraction.keywords[group]) != keywords:
+            raise SystemExit(f"Unexpected {group} keywords for {path}: {extraction.keywords[group]}")
+
+def bench_size(path: str, pages: int, repeat: int) -> dict:
+    tools = {
+        "FinancialDocumentTool": FinancialDocumentTool(),
+        "InvestmentTool": InvestmentTool(),
+        "RiskTool": RiskTool(),
+    }
+    raw_pages = list(iter_pdf_pages(path, normalize=False))
+    text = "".join(page + "\n" for page in raw_pages)
+    results = {
+        "pages": pages,
+        "file_bytes": os.path.getsize(path),
+        "text_chars": len(text),
+        "stages": {
+            "pdf_load": measure(lambda: list(iter_pdf_pages(path, normalize=False)), repeat, cold=False),
+            "normalize": measure(lambda: [normalize_page(page) for page in raw_pages], repeat, cold=False),
+            "extract": measure(lambda: extraction_engine.extract(text), repeat, cold=False),
+        },
+        "tools": {},
+    }
+    for name, tool in tools.items():
+        results["tools"][name] = {
+            "cold": measure(lambda: tool._run(path), repeat, cold=True),
+            "warm": measure(lambda: tool._run(path), repeat, cold=False),
+        }
+    return results
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(current: dict, baseline: dict) -> None:
+    """Print current/baseline time ratios for every measurement present in both runs"""
+    print(f"\n{'benchmark':60} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for size, result in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if not base:
+            continue
+        rows = [(f"{size}p stage {stage}", data, base["stages"].get(stage))
+                for stage, data in result["stages"].items()]
+        rows += [(f"{size}p {tool} {mode}", data, base["tools"].get(tool, {}).get(mode))
+                 for tool, modes in result["tools"].items() for mode, data in modes.items()]
+        for label, data, base_data in rows:
+            if not base_data:
+                continue
+            ratio = data["median_s"] / base_data["median_s"] if base_data["median_s"] else float("inf")
+            print(f"{label:60} {base_data['median_s']:>10.4f} {data['median_s']:>10.4f} {ratio:>6.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="page counts of the synthetic filings")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for pages in args.sizes:
+            path = os.path.join(workdir, f"synthetic_{pages}p.pdf")
+            write_synthetic_filing(path, pages)
+            check_outputs(path)
+            print(f"Benchmarking {pages}-page filing...", flush=True)
+            report["results"][str(pages)] = bench_size(path, pages, args.repeat)
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    report["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
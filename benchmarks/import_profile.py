@@ -0,0 +1,125 @@
+"""Cold-start profile of the API: import time of main and of the crew components.
+
+Each measurement runs in a fresh interpreter, so nothing is cached between
+runs. Reports the wall time of `import main`, the time of the first
+`load_crew_components()` call (crewai import plus agent construction), which
+heavy packages `import main` pulls in, and the slowest modules according to
+`python -X importtime`.
+
+Usage (from the repository root, no network or API keys needed):
+
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --baseline /path/to/older/checkout
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("crewai", "crewai_tools", "litellm", "embedchain", "langchain_core")
+
+# Runs inside the child interpreter, with the checkout as working directory
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, ".")
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+crew = None
+if hasattr(main, "load_crew_components"):
+    start = time.perf_counter()
+    main.load_crew_components()
+    crew = time.perf_counter() - start
+with open(sys.argv[1], "w") as f:
+    json.dump({{"import_main_s": imported, "load_crew_s": crew, "heavy_modules": heavy}}, f)
+"""
+
+def child_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OTEL_SDK_DISABLED", "true")
+    env.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    # Keep the probe's database out of the checkout
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'import_profile.db')}")
+    return env
+
+def probe(checkout: str, workdir: str) -> dict:
+    # Results go through a file: crewai filters the child's stdout
+    result_path = os.path.join(workdir, "probe.json")
+    subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=HEAVY_MODULES), result_path],
+        cwd=checkout, env=child_env(workdir), capture_output=True, text=True, check=True,
+    )
+    with open(result_path) as f:
+        return json.load(f)
+
+def slowest_imports(checkout: str, workdir: str, top: int) -> list:
+    """(cumulative seconds, module) of the top-level imports that dominate `import main`"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import sys; sys.path.insert(0, '.'); import main"],
+        cwd=checkout, env=child_env(workdir), capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Depth is the indentation of the module name; keep modules imported directly by main
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def profile(checkout: str, repeat: int, top: int) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [probe(checkout, workdir) for _ in range(repeat)]
+        imports = [run["import_main_s"] for run in runs]
+        crews = [run["load_crew_s"] for run in runs if run["load_crew_s"] is not None]
+        return {
+            "checkout": os.path.abspath(checkout),
+            "import_main_median_s": statistics.median(imports),
+            "import_main_min_s": min(imports),
+            "load_crew_median_s": statistics.median(crews) if crews else None,
+            "heavy_modules_at_import": runs[-1]["heavy_modules"],
+            "slowest_imports": slowest_imports(checkout, workdir, top),
+        }
+
+def print_report(report: dict) -> None:
+    print(f"\n{report['checkout']}")
+    print(f"  import main     median {report['import_main_median_s']:.3f}s  min {report['import_main_min_s']:.3f}s")
+    if report["load_crew_median_s"] is not None:
+        print(f"  first crew load median {report['load_crew_median_s']:.3f}s")
+    else:
+        print("  first crew load (built at import)")
+    print(f"  heavy modules loaded by import main: {', '.join(report['heavy_modules_at_import']) or 'none'}")
+    print("  slowest imports:")
+    for seconds, name in report["slowest_imports"]:
+        print(f"    {seconds:8.3f}s  {name}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkout", default=".", help="repository checkout to profile")
+    parser.add_argument("--baseline", help="another checkout (e.g. a worktree of the base branch) to compare with")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    reports = {"current": profile(args.checkout, args.repeat, args.top)}
+    if args.baseline:
+        reports["baseline"] = profile(args.baseline, args.repeat, args.top)
+    for report in reports.values():
+        print_report(report)
+    if args.baseline:
+        ratio = reports["baseline"]["import_main_median_s"] / reports["current"]["import_main_median_s"]
+        print(f"\nimport main is {ratio:.1f}x faster than the baseline")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""End-to-end load test of POST /analyze, fully offline.
+
+Drives the FastAPI app in-process (lifespan included) with an async HTTP client
+at each concurrency level: that many clients upload PDFs back to back until the
+level's requests are done. LLM completions come from benchmarks.stub_llm with a
+configurable latency, so everything else is real: upload streaming, parsing and
+indexing, the crew pool, agent executors and tool calls, and the database
+writes.
+
+Each request asks a distinct query, so the result cache never answers it; the
+LLM completion cache is off unless --llm-cache is given. The database, uploads
+and outputs go to a temporary directory.
+
+Reports per level: throughput, p50/p95/p99 latency, error rate by status, peak
+RSS, and the mean time per pipeline stage, tool and LLM call (from the app's
+Prometheus histograms), which shows where a level saturates: a growing
+crew_pool_wait means the crews are the bottleneck, growing upload or db_commit
+means file I/O or the database.
+
+Usage (from the repository root, no network or API keys needed):
+
+    python -m benchmarks.loadtest --concurrency 20 50 100
+    python -m benchmarks.loadtest --concurrency 50 --requests 500 --llm-latency 2 --pdf data/sample.pdf
+    CREW_POOL_SIZE=16 python -m benchmarks.loadtest --concurrency 100 --output load.json
+"""
+import os
+
+# Keep the run offline: no telemetry from crewai imports, no model cost map download
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import argparse
+import asyncio
+import contextlib
+import json
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def configure(workdir: str, args) -> None:
+    """Environment read by the app's modules at import; call before importing main"""
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        DATA_DIR=os.path.join(workdir, "data"),
+        OUTPUT_DIR=os.path.join(workdir, "outputs"),
+        LLM_LIMITER_STATE=os.path.join(workdir, "llm_limiter.json"),
+        LLM_CACHE_PATH=os.path.join(workdir, "llm_cache.db"),
+        LLM_CACHE_ENABLED="true" if args.llm_cache else "false",
+    )
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    if not args.rate_limit:
+        os.environ.update(LLM_RPM_LIMIT="0", LLM_TPM_LIMIT="0")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+def percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No procfs (macOS): fall back to the process's peak so far (bytes there, KiB on Linux)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+async def sample_peak_rss(peak: List[int], interval: float = 0.05) -> None:
+    while True:
+        peak[0] = max(peak[0], current_rss_bytes())
+        await asyncio.sleep(interval)
+
+def histogram_totals() -> Dict[str, Dict[str, List[float]]]:
+    """{metric: {label: [sum, count]}} of the app's latency histograms"""
+    from telemetry import STAGE_SECONDS, TOOL_SECONDS, LLM_SECONDS, LLM_WAIT_SECONDS
+
+    totals = {}
+    for name, histogram in (("stages", STAGE_SECONDS), ("tools", TOOL_SECONDS),
+                            ("llm", LLM_SECONDS), ("llm_ratelimit_wait", LLM_WAIT_SECONDS)):
+        series = totals.setdefault(name, {})
+        for metric in histogram.collect():
+            for sample in metric.samples:
+                if sample.name.endswith(("_sum", "_count")):
+                    label = next(iter(sample.labels.values()), "all")
+                    entry = series.setdefault(label, [0.0, 0])
+                    entry[0 if sample.name.endswith("_sum") else 1] += sample.value
+    return totals
+
+def histogram_means(before: dict, after: dict) -> dict:
+    """Mean milliseconds and count per label observed between two histogram_totals"""
+    means = {}
+    for name, series in after.items():
+        for label, (total, count) in series.items():
+            previous_total, previous_count = before.get(name, {}).get(label, [0.0, 0])
+            observed = int(count - previous_count)
+            if observed:
+                means.setdefault(name, {})[label] = {
+                    "count": observed,
+                    "mean_ms": round((total - previous_total) / observed * 1000, 1),
+                }
+    return means
+
+async def run_level(client, documents: List[tuple], concurrency: int, requests: int, args,
+                    provider, first: int = 0) -> dict:
+    """requests uploads by concurrency clients sending back to back, numbered from first"""
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    sample_errors: List[str] = []
+    next_request = iter(range(first, first + requests))
+    peak = [current_rss_bytes()]
+    before, calls_before = histogram_totals(), provider.calls
+
+    async def client_loop():
+        for number in next_request:
+            name, content = documents[number % len(documents)]
+            data = {"query": f"Summarize the outlook, revenue and risks (load test request {number})",
+                    "mode": args.mode}
+            begin = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    client.post("/analyze", files={"file": (name, content, "application/pdf")}, data=data),
+                    args.timeout,
+                )
+                outcome = str(response.status_code)
+                if response.status_code != 200 and len(sample_errors) < 5:
+                    sample_errors.append(f"{outcome}: {response.text[:200]}")
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            except Exception as e:
+                outcome = type(e).__name__
+                if len(sample_errors) < 5:
+                    sample_errors.append(f"{outcome}: {e}")
+            outcomes[outcome] += 1
+            if outcome == "200":
+                latencies.append(time.perf_counter() - begin)
+
+    sampler = asyncio.create_task(sample_peak_rss(peak))
+    began = time.perf_counter()
+    try:
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    finally:
+        elapsed = time.perf_counter() - began
+        sampler.cancel()
+    latencies.sort()
+    errors = requests - outcomes["200"]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "succeeded": outcomes["200"],
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "outcomes": dict(outcomes),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(outcomes["200"] / elapsed, 2) if elapsed else None,
+        "latency_p50_s": round(percentile(latencies, 0.50), 3) if latencies else None,
+        "latency_p95_s": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "latency_p99_s": round(percentile(latencies, 0.99), 3) if latencies else None,
+        "latency_max_s": round(latencies[-1], 3) if latencies else None,
+        "peak_rss_mb": round(peak[0] / 2**20, 1),
+        "llm_calls": provider.calls - calls_before,
+        "breakdown": histogram_means(before, histogram_totals()),
+        "sample_errors": sample_errors,
+    }
+
+def load_documents(workdir: str, args) -> List[tuple]:
+    """(file name, bytes) of --pdf files, or of synthetic filings of --pages pages"""
+    if args.pdf:
+        documents = []
+        for path in args.pdf:
+            with open(path, "rb") as f:
+                documents.append((os.path.basename(path), f.read()))
+        return documents
+    from benchmarks.synthetic_pdf import write_synthetic_filing
+
+    documents = []
+    for seed in range(args.documents):
+        path = os.path.join(workdir, f"filing_{seed}.pdf")
+        write_synthetic_filing(path, args.pages, seed=seed)
+        with open(path, "rb") as f:
+            documents.append((os.path.basename(path), f.read()))
+    return documents
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(workdir, args)
+        documents = load_documents(workdir, args)
+
+        import httpx
+        from benchmarks.stub_llm import StubProvider, install
+
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with quiet:
+            provider = install(StubProvider(latency=args.llm_latency, jitter=args.llm_jitter,
+                                            tool_steps=args.tool_steps, seed=0))
+            from main import app, crew_pool
+
+            levels, first = [], 0
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+                    for concurrency in args.concurrency:
+                        requests = args.requests or concurrency * 2
+                        print(f"Level: {concurrency} concurrent, {requests} requests...", file=sys.stderr)
+                        levels.append(await run_level(client, documents, concurrency, requests, args,
+                                                      provider, first))
+                        first += requests
+            pool_size = crew_pool.size
+
+    return {
+        "mode": args.mode,
+        "documents": [name for name, _ in documents],
+        "document_bytes": [len(content) for _, content in documents],
+        "llm_latency_s": args.llm_latency,
+        "llm_jitter_s": args.llm_jitter,
+        "tool_steps": args.tool_steps,
+        "crew_pool_size": pool_size,
+        "llm_cache": args.llm_cache,
+        "rate_limit": args.rate_limit,
+        "levels": levels,
+    }
+
+def print_report(report: dict) -> None:
+    print(f"mode={report['mode']} crew_pool_size={report['crew_pool_size']} "
+          f"llm_latency={report['llm_latency_s']}s tool_steps={report['tool_steps']} "
+          f"documents={len(report['documents'])}")
+    print(f"{'conc':>5} {'reqs':>5} {'ok':>5} {'err%':>6} {'rps':>7} {'p50 s':>7} {'p95 s':>7} "
+          f"{'p99 s':>7} {'rss MB':>7}")
+    for level in report["levels"]:
+        def cell(key):
+            value = level[key]
+            return "-" if value is None else value
+        print(f"{level['concurrency']:>5} {level['requests']:>5} {level['succeeded']:>5} "
+              f"{level['error_rate'] * 100:>6.1f} {cell('throughput_rps'):>7} {cell('latency_p50_s'):>7} "
+              f"{cell('latency_p95_s'):>7} {cell('latency_p99_s'):>7} {level['peak_rss_mb']:>7}")
+    for level in report["levels"]:
+        stages = level["breakdown"].get("stages", {})
+        slowest = sorted(stages.items(), key=lambda item: item[1]["mean_ms"], reverse=True)
+        print(f"  {level['concurrency']:>3} concurrent, mean ms per stage: "
+              + ", ".join(f"{stage} {entry['mean_ms']}" for stage, entry in slowest))
+        for error in level["sample_errors"]:
+            print(f"      {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[20, 50, 100],
+                        help="concurrent clients of each level")
+    parser.add_argument("--requests", type=int, help="requests per level (default: twice the concurrency)")
+    parser.add_argument("--mode", default="standard", choices=("standard", "full", "quick"))
+    parser.add_argument("--pdf", nargs="+", help="PDFs to upload (default: synthetic filings)")
+    parser.add_argument("--documents", type=int, default=4, help="synthetic filings to rotate through")
+    parser.add_argument("--pages", type=int, default=20, help="pages per synthetic filing")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per stub LLM completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="+/- seconds of uniform jitter")
+    parser.add_argument("--tool-steps", type=int, default=1, help="tool calls per agent before its final answer")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a request counts as timed out")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM completion cache on")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the LLM_RPM_LIMIT/LLM_TPM_LIMIT quota")
+    parser.add_argument("--verbose", action="store_true", help="show the crews' console output")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Screening latency over a synthetic corpus of analyzed filings.
+
+Fills a temporary database with N financial_metrics rows (realistic ranges,
+some figures missing as in real filings), then times the first build of the
+memory-mapped screening store, catching up after new analyses, and screens
+with typical filter and rank expressions. Match counts are checked against
+the same condition in SQL.
+
+Usage (from the repository root, no network or API keys needed):
+
+    python -m benchmarks.screening_bench --documents 10000 50000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCREENS = {
+    "high leverage, falling revenue": ("debt_to_equity > 2 and decline_pct > 10", "debt_to_equity"),
+    "profitable growers by margin": ("growth_pct > 5 and net_income > 0", "net_income / revenue"),
+    "high risk, weak liquidity": ("risk_level == 'High' and current_ratio < 1", None),
+    "rank only: largest revenue": (None, "revenue"),
+}
+# The first screen's condition in SQL, to check the match count
+SQL_CHECK = "debt_to_equity > 2 AND decline_pct > 10"
+
+def configure(workdir: str) -> None:
+    """Environment read by db.py and screening.py at import; call before importing them"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'screen.db')}"
+    os.environ["SCREEN_STORE_DIR"] = os.path.join(workdir, "screening")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+def synthetic_rows(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+
+    def maybe(value, present=0.85):
+        return value if rng.random() < present else None
+
+    rows = []
+    for _ in range(count):
+        revenue = rng.lognormvariate(20, 1.5)
+        rows.append({
+            "file_id": str(uuid.uuid4()),
+            "document_hash": uuid.uuid4().hex * 2,
+            "file_processed": f"filing_{rng.randrange(10**6)}.pdf",
+            "revenue": revenue,
+            "net_income": maybe(revenue * rng.uniform(-0.2, 0.3)),
+            "margin_pct": maybe(rng.uniform(-20, 40)),
+            "growth_pct": maybe(rng.uniform(-30, 40)),
+            "cash_flow": maybe(revenue * rng.uniform(-0.1, 0.2)),
+            "eps": maybe(rng.uniform(-2, 10)),
+            "total_debt": maybe(revenue * rng.uniform(0, 2)),
+            "debt_to_equity": maybe(rng.uniform(0, 4)),
+            "leverage": maybe(rng.uniform(0, 6), 0.3),
+            "decline_pct": maybe(rng.uniform(0, 30), 0.4),
+            "current_ratio": maybe(rng.uniform(0.3, 3), 0.6),
+            "risk_level": rng.choice(("Low", "Medium", "High", None)),
+        })
+    return rows
+
+def insert(rows: list) -> None:
+    from db import engine
+    from models import FinancialMetrics
+
+    with engine.begin() as connection:
+        connection.execute(FinancialMetrics.__table__.insert(), rows)
+
+def timed(fn, repeat: int) -> tuple:
+    """(median ms, last result) of repeat calls"""
+    times, result = [], None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - begin) * 1000)
+    return round(statistics.median(times), 2), result
+
+def run(sizes, repeat: int) -> list:
+    workdir = tempfile.mkdtemp()
+    try:
+        configure(workdir)
+        from db import create_tables, engine
+        from screening import ScreeningStore
+        from sqlalchemy import text
+
+        create_tables()
+        results, inserted = [], 0
+        for size in sorted(sizes):
+            insert(synthetic_rows(size - inserted, seed=size))
+            inserted = size
+            shutil.rmtree(os.environ["SCREEN_STORE_DIR"], ignore_errors=True)
+            store = ScreeningStore(os.environ["SCREEN_STORE_DIR"])
+            build_ms, _ = timed(store.refresh, 1)
+            noop_ms, _ = timed(store.refresh, repeat)
+            insert(synthetic_rows(100, seed=size + 1))
+            inserted += 100
+            catch_up_ms, _ = timed(store.refresh, 1)
+
+            report = {
+                "documents": inserted,
+                "store_mb": round(store.stats()["bytes"] / 2**20, 2),
+                "first_build_ms": build_ms,
+                "refresh_unchanged_ms": noop_ms,
+                "append_100_ms": catch_up_ms,
+                "screens": {},
+            }
+            for name, (condition, rank) in SCREENS.items():
+                ms, result = timed(lambda: store.screen(condition, rank, True, 50), repeat)
+                report["screens"][name] = {"median_ms": ms, "matched": result["matched"]}
+            with engine.connect() as connection:
+                expected = connection.execute(
+                    text(f"SELECT COUNT(*) FROM financial_metrics WHERE {SQL_CHECK}")
+                ).scalar()
+            report["sql_check"] = expected == report["screens"]["high leverage, falling revenue"]["matched"]
+            results.append(report)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, nargs="+", default=[10000, 50000], help="corpus sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per timed screen (median reported)")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.documents, args.repeat)
+    for report in results:
+        print(f"{report['documents']} documents ({report['store_mb']} MB of columns): "
+              f"first build {report['first_build_ms']} ms, unchanged refresh {report['refresh_unchanged_ms']} ms, "
+              f"+100 rows {report['append_100_ms']} ms, SQL check {'ok' if report['sql_check'] else 'MISMATCH'}")
+        for name, screen in report["screens"].items():
+            print(f"    {name:<32} {screen['median_ms']:>8} ms  {screen['matched']} matched")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    if not all(report["sql_check"] for report in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
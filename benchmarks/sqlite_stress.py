@@ -0,0 +1,191 @@
+"""Multi-process write stress test of the SQLite deployment mode.
+
+Starts N worker processes against one SQLite file, as N uvicorn workers
+would. Each runs several threads that look up cached results (reads) and
+persist analyses (an AnalysisResult plus its FinancialMetrics row) through
+the process's write-behind writer. Afterwards every acknowledged write is
+looked up: a write is lost if its commit was reported but its rows are missing,
+and failed if the caller got an error (e.g. "database is locked").
+
+--baseline runs the configuration this mode replaced for comparison: rollback
+journal, no busy timeout, no lock retries, and a direct commit per request.
+
+Usage (from the repository root, no network or API keys needed):
+
+    python -m benchmarks.sqlite_stress --workers 8
+    python -m benchmarks.sqlite_stress --workers 8 --baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def configure(db_path: str, baseline: bool) -> None:
+    """Environment read by db.py at import; call before importing it"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    if baseline:
+        os.environ.update(SQLITE_WAL="false", SQLITE_BUSY_TIMEOUT_MS="0", DB_LOCK_RETRIES="0")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+def _rows(index: int, thread: int, number: int) -> list:
+    from models import AnalysisResult, FinancialMetrics
+
+    file_id = f"stress-{index}-{thread}-{number}"
+    return [
+        AnalysisResult(
+            timestamp=time.strftime("%Y%m%d_%H%M%S"),
+            query="stress",
+            file_processed=f"{file_id}.pdf",
+            analysis="x" * 2000,
+            result="success",
+            file_id=file_id,
+            document_hash=file_id.ljust(64, "0")[:64],
+            cache_key=file_id.rjust(64, "0")[-64:],
+        ),
+        FinancialMetrics(file_id=file_id, document_hash=file_id.ljust(64, "0")[:64], revenue=1.0e9, risk_level="Low"),
+    ]
+
+def worker(index: int, db_path: str, args, start, results) -> None:
+    """One worker process: args.threads request threads doing args.writes writes each"""
+    configure(db_path, args.baseline)
+    import threading
+    from db import SessionLocal, db_writer
+    from models import AnalysisResult
+
+    acknowledged, failed, errors, latencies = [], [], [], []
+    lock = threading.Lock()
+
+    def direct_commit(rows):
+        db = SessionLocal()
+        try:
+            db.add_all(rows)
+            db.commit()
+        finally:
+            db.close()
+
+    def requests(thread: int):
+        for number in range(args.writes):
+            rows = _rows(index, thread, number)
+            file_id = rows[0].file_id
+            db = SessionLocal()
+            try:
+                # The cache lookup every /analyze request makes first
+                db.query(AnalysisResult).filter(AnalysisResult.cache_key == rows[0].cache_key).first()
+            except Exception as e:
+                with lock:
+                    errors.append(f"read: {e}".splitlines()[0])
+            finally:
+                db.close()
+            begin = time.perf_counter()
+            try:
+                if args.baseline:
+                    direct_commit(rows)
+                else:
+                    db_writer.write(*rows).result()
+            except Exception as e:
+                with lock:
+                    failed.append(file_id)
+                    errors.append(str(e).splitlines()[0])
+            else:
+                with lock:
+                    acknowledged.append(file_id)
+                    latencies.append(time.perf_counter() - begin)
+
+    threads = [threading.Thread(target=requests, args=(thread,)) for thread in range(args.threads)]
+    start.wait()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db_writer.stop()
+    results.put({"acknowledged": acknowledged, "failed": failed, "errors": errors[:5], "latencies": latencies})
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "stress.db")
+        configure(db_path, args.baseline)
+        from db import SessionLocal, create_tables
+        import models
+
+        create_tables()
+        context = multiprocessing.get_context("spawn")
+        start = context.Event()
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(index, db_path, args, start, results))
+            for index in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        time.sleep(1.0)  # Let every worker import before the writes start together
+        began = time.perf_counter()
+        start.set()
+        reports = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - began
+        for process in processes:
+            process.join()
+
+        db = SessionLocal()
+        try:
+            stored = {row[0] for row in db.query(models.AnalysisResult.file_id)}
+            stored_metrics = {row[0] for row in db.query(models.FinancialMetrics.file_id)}
+        finally:
+            db.close()
+        journal_mode = db_journal_mode(db_path)
+
+    acknowledged = [file_id for report in reports for file_id in report["acknowledged"]]
+    latencies = sorted(latency for report in reports for latency in report["latencies"])
+    lost = [file_id for file_id in acknowledged if file_id not in stored or file_id not in stored_metrics]
+    return {
+        "mode": "baseline" if args.baseline else "wal",
+        "journal_mode": journal_mode,
+        "workers": args.workers,
+        "attempted": args.workers * args.threads * args.writes,
+        "acknowledged": len(acknowledged),
+        "failed": sum(len(report["failed"]) for report in reports),
+        "lost": len(lost),
+        "rows_stored": len(stored),
+        "seconds": round(elapsed, 2),
+        "writes_per_second": round(len(acknowledged) / elapsed, 1),
+        "commit_p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "commit_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1) if latencies else None,
+        "sample_errors": sorted({error for report in reports for error in report["errors"]})[:5],
+    }
+
+def db_journal_mode(db_path: str) -> str:
+    import sqlite3
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        connection.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8, help="worker processes sharing the database")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent requests per worker")
+    parser.add_argument("--writes", type=int, default=50, help="analyses persisted per request thread")
+    parser.add_argument("--baseline", action="store_true", help="rollback journal, no busy timeout or retries, direct commits")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    for key, value in report.items():
+        print(f"{key:>18}: {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    # Non-zero exit when a write was lost, or failed outside the baseline
+    if report["lost"] or (report["failed"] and not args.baseline):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
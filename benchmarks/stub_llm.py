@@ -0,0 +1,103 @@
+"""Offline stand-in for the LLM provider, with configurable latency and canned answers.
+
+install() replaces the provider round-trip inside crewai's LLM (the litellm
+completion, streamed or not) and nothing else. Every call still goes through
+RateLimitedLLM (quota, completion cache, metrics), the agent executor parses
+the canned ReAct answers, and the tools really run on the uploaded PDF, so a
+load test exercises the service end to end without network or API keys.
+
+Each agent turn gets, in order: tool_steps actions calling the tools listed in
+its prompt (on the uploaded document), then a final answer.
+"""
+import ast
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+_TOOL = re.compile(r"Tool Name: (.+)\nTool Arguments: (\{.*\})")
+_PDF_PATH = re.compile(r"[^\s\"'`]+\.pdf")
+
+FINAL_ANSWER = (
+    "Revenue grew year over year while margins held steady. Debt is moderate relative "
+    "to equity and liquidity is adequate, so the overall risk level is medium. "
+    "Investors should weigh the growth outlook against the leverage noted in the filing."
+)
+
+def _tool_arguments(declared: str) -> Dict[str, str]:
+    """Argument name -> declared type, from a tool's 'Tool Arguments' line"""
+    try:
+        arguments = ast.literal_eval(declared)
+    except (ValueError, SyntaxError):
+        return {"path": "str"}
+    return {name: (spec or {}).get("type", "str") for name, spec in arguments.items()}
+
+class StubProvider:
+    """Canned completions after a sleep of latency (+/- jitter) seconds"""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, tool_steps: int = 1,
+                 answer: str = FINAL_ANSWER, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tool_steps = tool_steps
+        self.answer = answer
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tool_actions = 0
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            offset = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency + offset)
+
+    def respond(self, messages: List[dict]) -> str:
+        """The agent's next ReAct step for this conversation"""
+        time.sleep(self._delay())
+        text = "\n".join(str(message.get("content") or "") for message in messages)
+        tools: List[Tuple[str, str]] = _TOOL.findall(text)
+        # The executor appends one assistant message per completed tool step
+        steps = sum(message.get("role") == "assistant" for message in messages)
+        if steps >= self.tool_steps or not tools:
+            return f"Thought: I now know the final answer\nFinal Answer: {self.answer}"
+
+        name, declared = tools[steps % len(tools)]
+        paths = _PDF_PATH.findall(text)
+        arguments = {}
+        for argument, kind in _tool_arguments(declared).items():
+            if argument == "path":
+                arguments[argument] = paths[-1] if paths else "data/sample.pdf"
+            elif kind == "int":
+                arguments[argument] = 3
+            else:
+                arguments[argument] = "revenue, debt and outlook"
+        with self._lock:
+            self.tool_actions += 1
+        return (
+            f"Thought: I should use the {name.strip()}\n"
+            f"Action: {name.strip()}\n"
+            f"Action Input: {json.dumps(arguments)}"
+        )
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "tool_actions": self.tool_actions}
+
+def install(provider: StubProvider) -> StubProvider:
+    """Route every crewai LLM completion in this process to provider"""
+    from crewai.llm import LLM
+    from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+
+    def non_streaming(self, params, callbacks=None, available_functions=None):
+        return provider.respond(params["messages"])
+
+    def streaming(self, params, callbacks=None, available_functions=None):
+        text = provider.respond(params["messages"])
+        crewai_event_bus.emit(self, event=LLMStreamChunkEvent(chunk=text))
+        return text
+
+    LLM._handle_non_streaming_response = non_streaming
+    LLM._handle_streaming_response = streaming
+    return provider
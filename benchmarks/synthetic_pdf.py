@@ -0,0 +1,126 @@
+## Synthetic financial PDFs with known metrics, generated without any dependencies
+import random
+from typing import Dict, List, Sequence
+
+# Figures every synthetic filing states, and what the tools should extract from them
+EXPECTED_METRICS: Dict[str, str] = {
+    "revenue": "96.8",
+    "net_income": "15.0",
+    "margin": "18.2",
+    "growth": "19.0",
+    "cash_flow": "4,358",
+    "eps": "4.30",
+    "debt": "5,230",
+    "decline": "12.5",
+}
+EXPECTED_KEYWORDS: Dict[str, List[str]] = {
+    "liquidity": ["liquidity"],
+    "market": ["market volatility", "supply chain disruption", "inflation", "interest rate"],
+    "credit": ["credit rating"],
+}
+
+_SUMMARY = [
+    "MANAGEMENT'S DISCUSSION AND ANALYSIS",
+    "Total revenues: $96.8 billion for the fiscal year.",
+    "Net income: $15.0 billion, or earnings per share: $4.30 on a diluted basis.",
+    "Operating margin: 18.2% compared with 16.8% in the prior year.",
+    "Revenue growth: 19.0% year over year driven by higher deliveries.",
+    "Free cash flow: $4,358 million after capital expenditures.",
+    "Total debt: $5,230 million at year end.",
+]
+_RISKS = [
+    "RISK FACTORS",
+    "Our liquidity depends on continued access to capital markets.",
+    "Market volatility and inflation may reduce demand for our products.",
+    "A supply chain disruption could delay production and deliveries.",
+    "Changes in interest rate levels affect our financing costs.",
+    "Services revenue decreased by 12.5% in the fourth quarter.",
+    "A change in our credit rating could increase borrowing costs.",
+]
+_STATEMENT = [
+    "CONSOLIDATED STATEMENTS OF OPERATIONS (in millions, except per share data)",
+    "Year Ended December 31 2024 2023 2022",
+    "Total revenues 96,773 81,462 53,823",
+    "Cost of revenues 79,113 65,121 40,217",
+    "Gross profit 17,660 16,341 13,606",
+    "Income from operations 8,891 13,656 6,523",
+    "Net income 14,997 12,583 5,644",
+    "CONSOLIDATED BALANCE SHEETS",
+    "Total current assets 49,616 40,917 27,100",
+    "Total current liabilities 28,748 26,709 19,705",
+    "Total liabilities 43,009 36,440 30,548",
+    "Total stockholders' equity 62,634 44,704 30,189",
+    "CONSOLIDATED STATEMENTS OF CASH FLOWS",
+    "Net cash provided by operating activities 13,256 14,724 11,497",
+]
+_FILLER = (
+    "The company continued to invest in manufacturing capacity and new product "
+    "programs during the period while managing operating expenses and working "
+    "with suppliers to improve component availability across regions"
+).split()
+
+LINES_PER_PAGE = 56
+
+def _filler_line(rng: random.Random) -> str:
+    return " ".join(rng.choice(_FILLER) for _ in range(rng.randint(8, 14))).capitalize() + "."
+
+def synthetic_pages(page_count: int, seed: int = 0) -> List[List[str]]:
+    """Page line lists for a filing of page_count pages.
+
+    The first pages carry the summary, risk factors and statement tables that
+    the expected metrics come from; the rest are filler paragraphs.
+    """
+    rng = random.Random(seed)
+    fixed = [_SUMMARY, _RISKS, _STATEMENT]
+    pages = []
+    for number in range(page_count):
+        lines = list(fixed[number]) if number < len(fixed) else []
+        lines.append("")
+        while len(lines) < LINES_PER_PAGE:
+            # Blank lines exercise the blank-line normalization
+            lines.append("" if rng.random() < 0.1 else _filler_line(rng))
+        pages.append(lines)
+    return pages
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, pages: Sequence[Sequence[str]]) -> None:
+    """Write a minimal text-only PDF (Helvetica, one line per text row)"""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # Filled in once the page ids are known
+    page_ids = []
+    for lines in pages:
+        rows = " ".join(f"({_escape(line)}) '" for line in lines)
+        stream = f"BT /F1 10 Tf 50 780 Td 13 TL {rows} ET".encode("latin-1", "replace")
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+def write_synthetic_filing(path: str, page_count: int, seed: int = 0) -> None:
+    write_pdf(path, synthetic_pages(page_count, seed))
@@ -0,0 +1,142 @@
+## Pool of pre-built crews checked out one request at a time
+import os
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from telemetry import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# Crews built up front; also the number of crew runs in flight at once in this process
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "4"))
+
+class CrewPool:
+    """Fixed set of crews, each with its own agents, LLM instances and tasks.
+
+    A request checks a crew out for the whole kickoff, so no two requests ever
+    share agent or task objects (the module-level agents and task are only
+    used as the template). Per-run state is cleared when the crew is returned.
+    """
+
+    def __init__(self, template_factory: Callable[[], Any], size: int = CREW_POOL_SIZE):
+        self.template_factory = template_factory
+        self.size = size
+        self._template = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self._waiting = 0
+        # Counters
+        self.checkouts = 0
+        self.replaced = 0
+        self.cancelled = 0
+
+    async def start(self) -> None:
+        """Build the template and every pooled crew (once)"""
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            self._template = await asyncio.to_thread(self.template_factory)
+            idle = asyncio.Queue()
+            for _ in range(self.size):
+                idle.put_nowait(await asyncio.to_thread(self._template.copy))
+            self._idle = idle
+
+    async def kickoff(self, inputs: Dict[str, Any], progress=None, bypass_llm_cache: bool = False):
+        """Run a pooled crew on inputs, waiting for a free crew if all are busy.
+
+        With a ProgressStream, the crew's LLMs stream their completions to it.
+        bypass_llm_cache makes every LLM call of this run go to the provider.
+        Cancelling the awaiting task (a deadline, a client disconnect) stops the
+        crew at its next LLM call, so an abandoned run spends no more quota
+        and its thread is freed.
+        """
+        await self.start()
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            crew = await self._idle.get()
+        finally:
+            self._waiting -= 1
+        observe_stage("crew_pool_wait", time.perf_counter() - start)
+        self.checkouts += 1
+        cancel_event = threading.Event()
+        attach_request(crew, progress, bypass_llm_cache, cancel_event)
+
+        try:
+            result = await crew.kickoff_async(inputs)
+        except asyncio.CancelledError:
+            # The kickoff thread runs until its next LLM call; give the pool a fresh crew instead of this one
+            cancel_event.set()
+            self.cancelled += 1
+            self.replaced += 1
+            self._idle.put_nowait(self._template.copy())
+            raise
+        except BaseException:
+            self._release(crew)
+            raise
+        self._release(crew)
+        return result
+
+    def _release(self, crew) -> None:
+        try:
+            reset_crew(crew)
+        except Exception:
+            logger.exception("Could not reset a pooled crew; replacing it")
+            self.replaced += 1
+            crew = self._template.copy()
+        self._idle.put_nowait(crew)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "started": self._idle is not None,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "waiting": self._waiting,
+            "checkouts": self.checkouts,
+            "replaced": self.replaced,
+            "cancelled": self.cancelled,
+        }
+
+def attach_request(crew, progress=None, bypass_llm_cache: bool = False,
+                   cancel_event: Optional[threading.Event] = None) -> None:
+    """Point a crew's LLMs at one request's ProgressStream, cache policy and cancel event (defaults detach them)"""
+    for agent in crew.agents:
+        agent.llm.progress = progress
+        agent.llm.stream = progress is not None
+        agent.llm.bypass_cache = bypass_llm_cache
+        agent.llm.cancel_event = cancel_event
+
+def reset_crew(crew) -> None:
+    """Clear what a kickoff leaves on a crew, its tasks and its agents"""
+    from crewai.agents.agent_builder.utilities.base_token_process import TokenProcess
+
+    attach_request(crew)
+    crew._inputs = None
+    crew.usage_metrics = None
+    for task in crew.tasks:
+        task.output = None
+        task.start_time = None
+        task.end_time = None
+        task.used_tools = 0
+        task.tools_errors = 0
+        task.delegations = 0
+        task.processed_by_agents = set()
+        # Drop the previous request's query and file path from the interpolated prompts
+        if task._original_description is not None:
+            task.description = task._original_description
+        if task._original_expected_output is not None:
+            task.expected_output = task._original_expected_output
+    for agent in crew.agents:
+        agent.tools_results = []
+        agent.agent_executor = None
+        agent._times_executed = 0
+        agent._token_process = TokenProcess()
+        if agent._original_role is not None:
+            agent.role = agent._original_role
+        if agent._original_goal is not None:
+            agent.goal = agent._original_goal
+        if agent._original_backstory is not None:
+            agent.backstory = agent._original_backstory
@@ -1,18 +1,247 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, literal, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
+import time
+import queue
+import random
+import logging
+import functools
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
 
-# Read DATABASE_URL from env; default to local SQLite for dev
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+logger = logging.getLogger(__name__)
+
+# Read DATABASE_URL from env; default to local SQLite for dev, at an absolute path so every
+# worker process opens the same file wherever it was started
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.abspath('app.db')}")
+
+## SQLite tuning for several worker processes sharing one database file
+# Write-ahead log: readers and the (single) writer no longer block each other
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "yes")
+# How long a connection waits for another process's write lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Retries, with exponential backoff, of a transaction that still finds the database locked
+DB_LOCK_RETRIES = int(os.getenv("DB_LOCK_RETRIES", "5"))
+DB_LOCK_BACKOFF_SECONDS = float(os.getenv("DB_LOCK_BACKOFF_SECONDS", "0.05"))
 
 # Build engine args conditionally so SQLite keeps check_same_thread
 _engine_kwargs = {}
 if DATABASE_URL.startswith("sqlite"):
-    _engine_kwargs["connect_args"] = {"check_same_thread": False}
+    _engine_kwargs["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
 else:
     # tuned pooling for production Postgres (Neon)
     _engine_kwargs.update({"pool_size": 10, "max_overflow": 20, "pool_pre_ping": True})
 
 engine = create_engine(DATABASE_URL, **_engine_kwargs)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            if SQLITE_WAL:
+                cursor.execute("PRAGMA journal_mode=WAL")
+                # fsync at checkpoints instead of every commit; still corruption-safe in WAL mode
+                cursor.execute("PRAGMA synchronous=NORMAL")
+        finally:
+            cursor.close()
+
+def is_lock_error(error: Exception) -> bool:
+    """True for SQLite lock contention ("database is locked" / "database table is locked" / busy)"""
+    message = str(error).lower()
+    return isinstance(error, OperationalError) and ("locked" in message or "busy" in message)
+
+def retry_on_lock(func):
+    """Decorator for a function running one whole transaction: retry it while the database is locked"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        delay = DB_LOCK_BACKOFF_SECONDS
+        for attempt in range(DB_LOCK_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == DB_LOCK_RETRIES or not is_lock_error(e):
+                    raise
+                logger.warning("%s: database locked, retrying in %.2fs", func.__qualname__, delay)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+    return wrapper
+
+def create_tables() -> None:
+    """Create missing tables, then add missing columns and indexes to existing ones.
+
+    Tolerates other workers creating or upgrading the same tables at the same time.
+    """
+    for attempt in range(DB_LOCK_RETRIES + 1):
+        try:
+            Base.metadata.create_all(bind=engine)
+            upgrade_schema()
+            return
+        except (OperationalError, ProgrammingError) as e:
+            # Another worker created a table, column or index between our check and ours: check again
+            message = str(e).lower()
+            if attempt == DB_LOCK_RETRIES or not (
+                is_lock_error(e) or "already exists" in message or "duplicate column" in message
+            ):
+                raise
+            time.sleep(DB_LOCK_BACKOFF_SECONDS * random.uniform(0.5, 1.5))
+
+def upgrade_schema() -> None:
+    """Idempotent in-place upgrade of tables created by an older version of the models.
+
+    create_all never alters an existing table, so columns added to a model since
+    are added with ALTER TABLE ADD COLUMN (NOT NULL ones with their scalar
+    default), and its indexes are created if missing. Existing rows keep their data.
+    """
+    existing = inspect(engine)
+    tables = set(existing.get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            present = {column["name"] for column in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                definition = f"{engine.dialect.identifier_preparer.format_column(column)} " \
+                             f"{column.type.compile(dialect=engine.dialect)}"
+                if not column.nullable:
+                    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                    if default is None:
+                        raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} without a default")
+                    value = literal(default, column.type).compile(
+                        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    definition += f" NOT NULL DEFAULT {value}"
+                connection.execute(text(
+                    f"ALTER TABLE {engine.dialect.identifier_preparer.format_table(table)} ADD COLUMN {definition}"
+                ))
+                logger.info("Added column %s.%s", table.name, column.name)
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+## Write-behind writer: commits off the event loop, batching concurrent writes
+
+# Most queued writes committed together in one transaction
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "50"))
+# How long shutdown waits for queued writes to be committed
+DB_WRITE_FLUSH_TIMEOUT = float(os.getenv("DB_WRITE_FLUSH_TIMEOUT", "30"))
+
+class WriteBehindWriter:
+    """Background thread that inserts ORM objects, batching writes queued at the same time.
+
+    write() returns a future that completes only once the objects are committed,
+    so callers that wait on it get the same durability as a direct commit while
+    the event loop stays free. stop() commits everything still queued. Being the
+    only thread that inserts results, it also keeps this process to one SQLite
+    writer; lock contention with other processes is retried with backoff.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = DB_WRITE_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[Tuple[list, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Counters
+        self.batches = 0
+        self.committed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+                self._thread.start()
+
+    def write(self, *objects) -> Future:
+        """Queue objects for insertion; the future resolves after their commit"""
+        self.start()
+        future: Future = Future()
+        self._queue.put((list(objects), future))
+        return future
+
+    def stop(self, timeout: float = DB_WRITE_FLUSH_TIMEOUT) -> None:
+        """Commit every queued write, then stop the thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.error("Write-behind writer did not flush within %.0fs", timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "committed": self.committed,
+            "failed": self.failed,
+        }
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            # Take whatever else is already queued, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch: List[Tuple[list, Future]]) -> None:
+        try:
+            self._commit_objects([obj for objects, _ in batch for obj in objects])
+        except Exception:
+            logger.warning("Batched commit of %d writes failed; retrying individually", len(batch))
+        else:
+            self.batches += 1
+            self.committed += len(batch)
+            for _, future in batch:
+                future.set_result(None)
+            return
+        # One bad write (e.g. a unique violation) must not fail the others: retry one by one
+        for objects, future in batch:
+            try:
+                self._commit_objects(objects)
+            except Exception as e:
+                self.failed += 1
+                future.set_exception(e)
+            else:
+                self.committed += 1
+                future.set_result(None)
+
+    @retry_on_lock
+    def _commit_objects(self, objects: list) -> None:
+        db = self.session_factory()
+        try:
+            db.add_all(objects)
+            db.commit()
+            for obj in objects:
+                db.expunge(obj)
+        except Exception:
+            db.rollback()
+            # The failed flush leaves the objects attached to this session; free them for a retry
+            db.expunge_all()
+            raise
+        finally:
+            db.close()
+
+db_writer = WriteBehindWriter()
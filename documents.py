@@ -0,0 +1,525 @@
+## Parsed-document cache, metric extraction and chunk indexes shared by the tools and the API
+# Kept free of crewai imports so the API starts without loading the agent framework.
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Tuple, Dict, List, Optional
+import re
+
+from pdf_extraction import iter_pdf_pages, normalize_page
+from retrieval import ChunkIndex, ChunkIndexCache
+from statements import FinancialStatements, extract_statements
+from telemetry import record_path_stage
+
+## Creating a shared cache of parsed PDF documents
+# Upper bound on the memory held by cached page texts (default 256 MB)
+DOC_CACHE_MAX_BYTES = int(os.getenv("DOC_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Only the first DOC_MAX_PAGES pages of a document are parsed (0 = all pages)
+DOC_MAX_PAGES = int(os.getenv("DOC_MAX_PAGES", "0"))
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@dataclass(frozen=True, eq=False)
+class ParsedDocument:
+    """Page texts of a parsed PDF plus the normalized full text"""
+    digest: str
+    pages: Tuple[str, ...]
+    normalized_text: str
+
+    @property
+    def text(self) -> str:
+        """Raw page texts joined one page per line block, as the metric tools expect"""
+        return "".join(page + "\n" for page in self.pages)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(sys.getsizeof(page) for page in self.pages) + sys.getsizeof(self.normalized_text)
+
+class ParsedDocumentCache:
+    """Thread-safe LRU cache of parsed PDFs keyed by the SHA-256 of the file content.
+
+    Every tool reads documents through this cache so one upload is parsed once,
+    no matter how many tool calls the crew makes against it.
+    """
+
+    def __init__(self, max_bytes: int = DOC_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, ParsedDocument]" = OrderedDict()
+        # (realpath, mtime, size) -> digest, so unchanged files are not re-hashed
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        # digest -> event set once the thread parsing it has finished
+        self._loading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def digest_for(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(path)
+            with self._lock:
+                if len(self._digests) >= 4096:
+                    self._digests.clear()
+                self._digests[key] = digest
+        return digest
+
+    def get(self, path: str, digest: Optional[str] = None) -> ParsedDocument:
+        """Return the parsed document at path, parsing it only on a cache miss.
+
+        digest, when the caller already hashed the file (e.g. while saving an
+        upload), skips hashing it again.
+        """
+        digest = digest or self.digest_for(path)
+        while True:
+            with self._lock:
+                document = self._entries.get(digest)
+                if document is not None:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return document
+                pending = self._loading.get(digest)
+                if pending is None:
+                    # This thread parses; concurrent callers wait for it instead of parsing too
+                    self._loading[digest] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+
+        try:
+            document = self._parse(path, digest)
+            self.put(document)
+            return document
+        finally:
+            with self._lock:
+                self._loading.pop(digest).set()
+
+    def put(self, document: ParsedDocument) -> None:
+        size = document.size_bytes
+        if size > self.max_bytes:
+            return  # Too large to cache without evicting everything else
+        with self._lock:
+            if document.digest in self._entries:
+                return
+            self._entries[document.digest] = document
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size_bytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    @staticmethod
+    def _parse(path: str, digest: str) -> ParsedDocument:
+        start = time.perf_counter()
+        pages = tuple(iter_pdf_pages(path, max_pages=DOC_MAX_PAGES or None, normalize=False))
+        normalized_text = "".join(normalize_page(page) + "\n" for page in pages)
+        record_path_stage(path, "pdf_parse", time.perf_counter() - start)
+        return ParsedDocument(digest=digest, pages=pages, normalized_text=normalized_text)
+
+document_cache = ParsedDocumentCache()
+
+## Creating per-document chunk indexes for the search tool
+# Most characters of chunk text a single search returns
+RETRIEVAL_MAX_CHARS = int(os.getenv("RETRIEVAL_MAX_CHARS", "8000"))
+
+chunk_indexes = ChunkIndexCache()
+
+def document_index(path: str) -> ChunkIndex:
+    """Chunk index of the PDF at path, parsed and built once per document"""
+    document = document_cache.get(path)
+    return chunk_indexes.get(document.digest, document.pages)
+
+## Creating a shared extraction engine for the metric and risk tools
+# Metric name -> patterns tried in priority order; the first pattern that matches wins
+METRIC_PATTERNS: Dict[str, List[str]] = {
+    # Revenue information
+    "revenue": [
+        r'(?:total\s+)?revenues?\s*:?\s*\$?([\d,\.]+)\s*(?:billion|million|B|M)',
+        r'revenue\s+(?:of\s+)?\$?([\d,\.]+)\s*(?:billion|million|B|M)',
+        r'net\s+revenue\s*:?\s*\$?([\d,\.]+)'
+    ],
+    # Profit/income information
+    "net_income": [
+        r'(?:net\s+)?income\s*:?\s*\$?([\d,\.]+)\s*(?:billion|million|B|M)',
+        r'operating\s+income\s*:?\s*\$?([\d,\.]+)',
+        r'profit\s*:?\s*\$?([\d,\.]+)'
+    ],
+    "margin": [r'(?:operating\s+|gross\s+)?margin\s*:?\s*([\d\.]+)%'],
+    "growth": [r'(?:revenue\s+)?growth\s*:?\s*([+-]?[\d\.]+)%'],
+    "cash_flow": [r'(?:free\s+)?cash\s+flow\s*:?\s*\$?([\d,\.]+)'],
+    "eps": [r'earnings\s+per\s+share\s*:?\s*\$?([\d\.]+)'],
+    # Debt and leverage risks
+    "debt": [
+        r'total\s+debt\s*:?\s*\$?([\d,\.]+)',
+        r'debt.to.equity\s*:?\s*([\d\.]+)',
+        r'leverage\s*:?\s*([\d\.]+)'
+    ],
+    # Declining metrics
+    "decline": [
+        r'(?:revenue\s+)?decreas(?:ed?|ing)\s+(?:by\s+)?([\d\.]+)%',
+        r'(?:profit\s+)?drop(?:ped?|ping)\s+(?:by\s+)?([\d\.]+)%',
+        r'down\s+([\d\.]+)%'
+    ],
+}
+
+# Keyword group -> keywords, matched case-insensitively in list order
+KEYWORD_GROUPS: Dict[str, List[str]] = {
+    "liquidity": ['liquidity', 'cash shortage', 'working capital deficit', 'cash crunch'],
+    "market": [
+        'market volatility', 'economic uncertainty', 'regulatory changes',
+        'competitive pressure', 'supply chain disruption', 'cybersecurity',
+        'inflation', 'interest rate', 'currency fluctuation'
+    ],
+    "credit": ['downgrade', 'credit rating', 'default risk'],
+}
+
+@dataclass(frozen=True)
+class MetricMatch:
+    """First match of a metric pattern: captured value and its offsets in the text"""
+    metric: str
+    value: str
+    start: int
+    end: int
+    # Index into METRIC_PATTERNS[metric] of the pattern that matched
+    pattern_index: int
+    # Full matched text, including any unit suffix
+    matched_text: str
+
+@dataclass(frozen=True)
+class Extraction:
+    """Structured output of one pass of the extraction engine over a document"""
+    metrics: Dict[str, MetricMatch]
+    # Keyword group -> {keyword: offset of its first occurrence}, in keyword list order
+    keywords: Dict[str, Dict[str, int]]
+    # Multi-period statement tables; preferred over the first-match metrics when present
+    statements: Optional[FinancialStatements] = None
+
+    def first_keyword(self, group: str) -> Optional[str]:
+        found = self.keywords.get(group, {})
+        return next(iter(found), None)
+
+class ExtractionEngine:
+    """Precompiled metric patterns and keyword lists shared by InvestmentTool and RiskTool.
+
+    The text is lowercased once per document. Each regex stops at its first
+    match (the tools only ever use the first one), and each keyword is located
+    with a single C-level substring search over the lowered text, which is
+    faster in CPython than stepping a pure-Python automaton character by character.
+    """
+
+    def __init__(
+        self,
+        metric_patterns: Dict[str, List[str]] = METRIC_PATTERNS,
+        keyword_groups: Dict[str, List[str]] = KEYWORD_GROUPS,
+        cache_size: int = 64,
+    ):
+        self.metric_patterns = {
+            metric: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for metric, patterns in metric_patterns.items()
+        }
+        self.keyword_groups = {group: [kw.lower() for kw in kws] for group, kws in keyword_groups.items()}
+        self.cache_size = cache_size
+        # digest -> Extraction, so both tools share one pass per document
+        self._results: "OrderedDict[str, Extraction]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def extract(self, text: str) -> Extraction:
+        metrics = {}
+        for metric, patterns in self.metric_patterns.items():
+            for index, pattern in enumerate(patterns):
+                match = pattern.search(text)
+                if match:
+                    metrics[metric] = MetricMatch(
+                        metric=metric,
+                        value=match.group(1),
+                        start=match.start(1),
+                        end=match.end(1),
+                        pattern_index=index,
+                        matched_text=match.group(0),
+                    )
+                    break
+
+        lowered = text.lower()
+        keywords = {}
+        for group, group_keywords in self.keyword_groups.items():
+            found = {}
+            for keyword in group_keywords:
+                offset = lowered.find(keyword)
+                if offset >= 0:
+                    found[keyword] = offset
+            keywords[group] = found
+        return Extraction(metrics=metrics, keywords=keywords)
+
+    def extract_document(self, document: ParsedDocument) -> Extraction:
+        """Extraction for a cached document, computed once per content digest"""
+        with self._lock:
+            result = self._results.get(document.digest)
+            if result is not None:
+                self._results.move_to_end(document.digest)
+                return result
+        result = replace(self.extract(document.text), statements=extract_statements(document.pages))
+        with self._lock:
+            self._results[document.digest] = result
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+extraction_engine = ExtractionEngine()
+
+def format_amount(value: float) -> str:
+    """Currency amount in units as e.g. '$96.77 billion'"""
+    sign = "-" if value < 0 else ""
+    magnitude = abs(value)
+    for unit, scale in (("trillion", 1e12), ("billion", 1e9), ("million", 1e6)):
+        if magnitude >= scale:
+            return f"{sign}${magnitude / scale:,.2f} {unit}"
+    return f"{sign}${magnitude:,.0f}"
+
+def format_pct(value: float) -> str:
+    return f"{value:.1f}%"
+
+def format_ratio(value: float) -> str:
+    return f"{value:.2f}"
+
+def _by_period(statements: Optional[FinancialStatements], series: Optional[str], fmt) -> Optional[str]:
+    """'value (period), ...' for every period reporting series, latest first"""
+    if statements is None or series is None:
+        return None
+    return ", ".join(f"{fmt(value)} ({period})" for period, value in statements.reported(series)) or None
+
+def investment_insights(extraction: Extraction) -> List[str]:
+    """Investment metric lines reported by InvestmentTool.
+
+    Statement tables, when the document has them, supply every period of a
+    metric; otherwise the first match in the text is reported.
+    """
+    metrics = extraction.metrics
+    statements = extraction.statements
+    insights = []
+
+    def add(label, series, fmt, metric=None, fallback=None):
+        values = _by_period(statements, series, fmt)
+        if values:
+            insights.append(f"{label}: {values}")
+        elif metric in metrics:
+            insights.append(fallback.format(metrics[metric].value))
+
+    add("Revenue", "revenue", format_amount, "revenue", "Revenue: ${}")
+    add("Net Income", "net_income", format_amount, "net_income", "Net Income: ${}")
+    add("Net Margin", "net_margin_pct", format_pct, "margin", "Margin: {}%")
+    add("Revenue Growth (YoY)", "revenue_growth_pct", format_pct, "growth", "Growth Rate: {}%")
+    add("Operating Cash Flow", "operating_cash_flow", format_amount, "cash_flow", "Cash Flow: ${}")
+    add("EPS", None, None, "eps", "EPS: ${}")
+    # Only available from statement tables
+    add("Gross Margin", "gross_margin_pct", format_pct)
+    add("Operating Margin", "operating_margin_pct", format_pct)
+    add("Free Cash Flow", "free_cash_flow", format_amount)
+    add("Current Ratio", "current_ratio", format_ratio)
+    add("Debt-to-Equity", "debt_to_equity", format_ratio)
+    return insights
+
+def assess_risks(extraction: Extraction) -> Tuple[List[str], str]:
+    """Risk lines and overall risk level reported by RiskTool"""
+    metrics = extraction.metrics
+    statements = extraction.statements
+    risks = []
+    risk_level = "Low"
+
+    def latest(series):
+        return statements.latest(series) if statements is not None else None
+
+    # Debt and leverage risks
+    debt = latest("total_debt")
+    if debt is not None:
+        line = f"Debt Exposure: {format_amount(debt[1])} total debt ({debt[0]})"
+        leverage = latest("debt_to_equity")
+        if leverage is not None:
+            line += f", debt-to-equity {format_ratio(leverage[1])}"
+        risks.append(line)
+        risk_level = "High" if leverage is not None and leverage[1] > 2 else "Medium"
+    elif "debt" in metrics:
+        risks.append(f"Debt Exposure: {metrics['debt'].value}")
+        risk_level = "Medium"
+
+    # Liquidity risks
+    current_ratio = latest("current_ratio")
+    if current_ratio is not None and current_ratio[1] < 1:
+        risks.append(f"Liquidity Risk: current ratio {format_ratio(current_ratio[1])} ({current_ratio[0]}) is below 1.0")
+        risk_level = "High"
+    liquidity_keyword = extraction.first_keyword("liquidity")
+    if liquidity_keyword:
+        risks.append(f"Liquidity Risk: {liquidity_keyword.title()} mentioned in document")
+        risk_level = "High"
+
+    # Market and operational risks
+    found_risks = list(extraction.keywords["market"])
+    if found_risks:
+        risks.append(f"Market/Operational Risks: {', '.join(found_risks)}")
+        if len(found_risks) > 2:
+            risk_level = "High"
+        elif risk_level == "Low":
+            risk_level = "Medium"
+
+    # Declining metrics
+    growth = latest("revenue_growth_pct")
+    if growth is not None:
+        if growth[1] < 0:
+            risks.append(f"Performance Decline: revenue down {format_pct(-growth[1])} year over year ({growth[0]})")
+            if -growth[1] > 10:
+                risk_level = "High"
+            elif risk_level == "Low":
+                risk_level = "Medium"
+    elif "decline" in metrics:
+        decline = metrics["decline"].value
+        risks.append(f"Performance Decline: {decline}% decrease noted")
+        if float(decline) > 10:
+            risk_level = "High"
+        elif risk_level == "Low":
+            risk_level = "Medium"
+
+    net_income = latest("net_income")
+    if net_income is not None and net_income[1] < 0:
+        risks.append(f"Profitability Risk: net loss of {format_amount(-net_income[1])} ({net_income[0]})")
+        if risk_level == "Low":
+            risk_level = "Medium"
+
+    # Credit rating mentions
+    if extraction.keywords["credit"]:
+        risks.append("Credit Risk: Rating or default concerns mentioned")
+        risk_level = "High"
+
+    return risks, risk_level
+
+## Normalizing extracted figures into typed values
+_UNIT_SCALES = {"thousand": 1e3, "million": 1e6, "billion": 1e9, "trillion": 1e12, "k": 1e3, "m": 1e6, "b": 1e9}
+_UNIT_SUFFIX = re.compile(r'\s*(thousand|million|billion|trillion|K|M|B)\b', re.IGNORECASE)
+# Metrics stated in currency, scaled by any unit word that follows the number
+CURRENCY_METRICS = ("revenue", "net_income", "cash_flow", "total_debt")
+# Extracted metric -> key of its normalized value (percentages carry a _pct suffix)
+METRIC_COLUMNS = {
+    "revenue": "revenue",
+    "net_income": "net_income",
+    "margin": "margin_pct",
+    "growth": "growth_pct",
+    "cash_flow": "cash_flow",
+    "eps": "eps",
+    "total_debt": "total_debt",
+    "debt_to_equity": "debt_to_equity",
+    "leverage": "leverage",
+    "decline": "decline_pct",
+}
+# Normalized key -> statement series (latest period) that replaces the first text match
+STATEMENT_COLUMNS = {
+    "revenue": "revenue",
+    "net_income": "net_income",
+    "margin_pct": "net_margin_pct",
+    "growth_pct": "revenue_growth_pct",
+    "cash_flow": "operating_cash_flow",
+    "total_debt": "total_debt",
+    "debt_to_equity": "debt_to_equity",
+    "current_ratio": "current_ratio",
+}
+
+def parse_number(value: str) -> Optional[float]:
+    """Float from a captured figure such as '1,234.5', or None if it is not a number"""
+    try:
+        return float(value.replace(",", ""))
+    except ValueError:
+        return None
+
+def _unit_scale(text: str, match: MetricMatch) -> float:
+    suffix = _UNIT_SUFFIX.match(text, match.end)
+    return _UNIT_SCALES[suffix.group(1).lower()] if suffix else 1.0
+
+def normalized_metrics(document: ParsedDocument) -> Dict[str, Optional[float]]:
+    """Typed values of the figures InvestmentTool and RiskTool report for a document.
+
+    Currency amounts are scaled to units (e.g. '$1.2 billion' -> 1.2e9) and
+    percentages are kept as percent values. Missing or unparseable figures are None.
+    Values found in statement tables (latest period) take precedence.
+    """
+    extraction = extraction_engine.extract_document(document)
+    text = document.text
+    metrics = dict(extraction.metrics)
+    # Split the debt match by which pattern produced it
+    debt = metrics.pop("debt", None)
+    if debt is not None:
+        metrics[("total_debt", "debt_to_equity", "leverage")[debt.pattern_index]] = debt
+
+    values: Dict[str, Optional[float]] = {}
+    for name, column in METRIC_COLUMNS.items():
+        match = metrics.get(name)
+        number = parse_number(match.value) if match else None
+        if number is not None and name in CURRENCY_METRICS:
+            number *= _unit_scale(text, match)
+        values[column] = number
+    values["current_ratio"] = None
+    if extraction.statements is not None:
+        for column, series in STATEMENT_COLUMNS.items():
+            latest = extraction.statements.latest(series)
+            if latest is not None:
+                values[column] = latest[1]
+
+    try:
+        values["risk_level"] = assess_risks(extraction)[1]
+    except ValueError:
+        # Unparseable decline figure; RiskTool reports an error for these documents too
+        values["risk_level"] = None
+    return values
+
+def quick_analysis(document: ParsedDocument) -> dict:
+    """Metrics, investment insights and risk assessment of a document, without any LLM call"""
+    extraction = extraction_engine.extract_document(document)
+    try:
+        risks, risk_level = assess_risks(extraction)
+    except ValueError:
+        risks, risk_level = [], None
+    metrics = normalized_metrics(document)
+    metrics.pop("risk_level")
+    return {
+        "pages": len(document.pages),
+        "metrics": metrics,
+        "investment_insights": investment_insights(extraction),
+        "risk": {"level": risk_level, "factors": risks},
+        "statements": extraction.statements.as_dict() if extraction.statements is not None else None,
+    }
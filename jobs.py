@@ -0,0 +1,237 @@
+## Background analysis jobs backed by the analysis_jobs table
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from db import SessionLocal, retry_on_lock
+from models import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs analyzed concurrently by this process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Maximum number of queued jobs before POST /jobs answers 429
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+# A job still running after this long is stopped and failed; one left running this long
+# (plus JOB_LEASE_GRACE_SECONDS) is assumed abandoned (e.g. the process died) and requeued
+JOB_TIMEOUT_SECONDS = int(os.getenv("JOB_TIMEOUT_SECONDS", "900"))
+# Margin for a worker to record its own timeout before other workers treat the job as abandoned
+JOB_LEASE_GRACE_SECONDS = 60
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# How often idle workers look for jobs submitted by other processes
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+def remove_job_upload(file_path: Optional[str]) -> None:
+    """Delete the upload of a job that reached a final state, ignoring errors"""
+    if file_path:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+class JobQueueFull(Exception):
+    """Raised when the queue already holds JOB_QUEUE_MAX jobs"""
+
+class JobQueue:
+    """Bounded pool of asyncio workers that run queued analysis jobs.
+
+    The database is the queue: jobs are rows in analysis_jobs and workers claim
+    them with a conditional UPDATE, so queued work survives restarts and several
+    API processes can share one queue.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[AnalysisJob], Awaitable[str]],
+        workers: int = JOB_WORKERS,
+        max_queued: int = JOB_QUEUE_MAX,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        requeued = await asyncio.to_thread(self._requeue_abandoned)
+        if requeued:
+            logger.info("Requeued %d abandoned jobs", requeued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def is_full(self) -> bool:
+        return await asyncio.to_thread(self._count_queued) >= self.max_queued
+
+    async def submit(self, job: AnalysisJob) -> None:
+        """Persist a queued job and wake a worker, or raise JobQueueFull"""
+        if await self.is_full():
+            raise JobQueueFull()
+        await asyncio.to_thread(self._insert, job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def record(self, job: AnalysisJob) -> None:
+        """Persist a job that needs no worker, such as one answered from the result cache"""
+        await asyncio.to_thread(self._insert, job)
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        db = SessionLocal()
+        try:
+            return db.get(AnalysisJob, job_id)
+        finally:
+            db.close()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self._claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._requeue_abandoned)
+                continue
+
+            try:
+                # Bounded, so a job is never still running here when another worker requeues it
+                analysis = await asyncio.wait_for(self.handler(job), JOB_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning("Job %s did not finish within %d seconds", job.id, JOB_TIMEOUT_SECONDS)
+                await asyncio.to_thread(
+                    self._finish, job.id, "failed", None,
+                    f"Job did not finish within {JOB_TIMEOUT_SECONDS} seconds"
+                )
+                remove_job_upload(job.file_path)
+            except asyncio.CancelledError:
+                # Shutdown: the job did not fail, so hand it (and its kept upload) to the next worker
+                await asyncio.to_thread(self._release, job.id)
+                raise
+            except Exception as e:
+                logger.exception("Job %s failed", job.id)
+                await asyncio.to_thread(self._finish, job.id, "failed", None, str(e))
+            else:
+                await asyncio.to_thread(self._finish, job.id, "succeeded", analysis, None)
+
+    def _count_queued(self) -> int:
+        db = SessionLocal()
+        try:
+            return db.query(AnalysisJob).filter(AnalysisJob.status == "queued").count()
+        finally:
+            db.close()
+
+    @retry_on_lock
+    def _insert(self, job: AnalysisJob) -> None:
+        db = SessionLocal()
+        try:
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+
+    @retry_on_lock
+    def _claim_next(self) -> Optional[AnalysisJob]:
+        """Atomically move the oldest queued job to running and return it"""
+        db = SessionLocal()
+        try:
+            candidates = (
+                db.query(AnalysisJob.id)
+                .filter(AnalysisJob.status == "queued")
+                .order_by(AnalysisJob.created_at)
+                .limit(self.workers)
+                .all()
+            )
+            for (job_id,) in candidates:
+                claimed = (
+                    db.query(AnalysisJob)
+                    .filter(AnalysisJob.id == job_id, AnalysisJob.status == "queued")
+                    .update(
+                        {
+                            AnalysisJob.status: "running",
+                            AnalysisJob.started_at: datetime.now(timezone.utc),
+                            AnalysisJob.attempts: AnalysisJob.attempts + 1,
+                        },
+                        synchronize_session=False,
+                    )
+                )
+                db.commit()
+                if claimed:
+                    job = db.get(AnalysisJob, job_id)
+                    db.expunge(job)
+                    return job
+            return None
+        finally:
+            db.close()
+
+    @retry_on_lock
+    def _release(self, job_id: str) -> None:
+        """Put a running job back in the queue without counting the interrupted attempt"""
+        db = SessionLocal()
+        try:
+            db.query(AnalysisJob).filter(AnalysisJob.id == job_id, AnalysisJob.status == "running").update(
+                {
+                    AnalysisJob.status: "queued",
+                    AnalysisJob.started_at: None,
+                    AnalysisJob.attempts: AnalysisJob.attempts - 1,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    @retry_on_lock
+    def _finish(self, job_id: str, status: str, analysis: Optional[str], error: Optional[str]) -> None:
+        db = SessionLocal()
+        try:
+            db.query(AnalysisJob).filter(AnalysisJob.id == job_id).update(
+                {
+                    AnalysisJob.status: status,
+                    AnalysisJob.analysis: analysis,
+                    AnalysisJob.error: error,
+                    AnalysisJob.finished_at: datetime.now(timezone.utc),
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    @retry_on_lock
+    def _requeue_abandoned(self) -> int:
+        """Requeue running jobs past their lease, failing those out of attempts"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_TIMEOUT_SECONDS + JOB_LEASE_GRACE_SECONDS)
+        db = SessionLocal()
+        try:
+            stale = db.query(AnalysisJob).filter(
+                AnalysisJob.status == "running", AnalysisJob.started_at < cutoff
+            )
+            exhausted = stale.filter(AnalysisJob.attempts >= JOB_MAX_ATTEMPTS)
+            # Failed for good: their uploads are no longer needed
+            uploads = [path for (path,) in exhausted.with_entities(AnalysisJob.file_path)]
+            exhausted.update(
+                {
+                    AnalysisJob.status: "failed",
+                    AnalysisJob.error: "Job exceeded the maximum number of attempts",
+                    AnalysisJob.finished_at: datetime.now(timezone.utc),
+                },
+                synchronize_session=False,
+            )
+            requeued = stale.filter(AnalysisJob.attempts < JOB_MAX_ATTEMPTS).update(
+                {AnalysisJob.status: "queued"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+        for path in uploads:
+            remove_job_upload(path)
+        return requeued
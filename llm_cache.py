@@ -0,0 +1,196 @@
+## Persistent LLM completion cache shared by all agents, requests and worker processes
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Tuple
+
+from telemetry import LLM_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Bypass switch: with false, every LLM call goes to the provider
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# SQLite file holding the completions; every uvicorn worker on the host opens the same one
+# (absolute, so workers started from different directories agree on it)
+LLM_CACHE_PATH = os.path.abspath(os.getenv("LLM_CACHE_PATH", "llm_cache.db"))
+# Least recently used completions are evicted once the cached text exceeds this size
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_completions_last_used ON completions (last_used);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('bytes', 0);
+"""
+
+# Saved uploads get a fresh UUID name per request; keys and stored completions refer to
+# the document by content instead, so a re-run on a new upload of it still hits
+_UPLOAD_PATH = re.compile(r"[^\s\"'`]*financial_document_[0-9a-f-]{36}\.pdf")
+DOCUMENT_PLACEHOLDER = "<uploaded document>"
+
+def prompt_upload_path(messages) -> Optional[str]:
+    """The saved upload a prompt refers to, if it refers to exactly one"""
+    text = messages if isinstance(messages, str) else " ".join(str(message.get("content") or "") for message in messages)
+    paths = set(_UPLOAD_PATH.findall(text))
+    return paths.pop() if len(paths) == 1 else None
+
+def completion_key(model: str, temperature, messages, tools=None,
+                   upload: Optional[Tuple[str, str]] = None) -> str:
+    """SHA-256 of everything that determines a completion: model, temperature, messages and tools.
+
+    upload is (path, content digest) of the document the prompt refers to; the
+    path is replaced by the digest.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages, "tools": tools},
+        sort_keys=True, default=str,
+    )
+    if upload is not None:
+        payload = payload.replace(upload[0], f"<document {upload[1]}>")
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CompletionCache:
+    """Completions in a WAL-mode SQLite file, evicted least-recently-used past max_bytes.
+
+    The running size lives in the meta table and is updated in the same
+    transaction as each insert or eviction, so all processes share one budget.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Counters (this process)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def get(self, key: str, upload_path: Optional[str] = None) -> Optional[str]:
+        """Cached completion for key (refreshing its recency), or None.
+
+        A cache that cannot be read counts as a miss: it must never fail the LLM call.
+        """
+        try:
+            with self._lock:
+                connection = self._connect()
+                row = connection.execute("SELECT response FROM completions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE completions SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+                    )
+        except sqlite3.Error:
+            logger.warning("LLM cache lookup failed", exc_info=True)
+            self.errors += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            LLM_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+        self.hits += 1
+        LLM_CACHE_LOOKUPS.labels("hit").inc()
+        return row[0].replace(DOCUMENT_PLACEHOLDER, upload_path) if upload_path else row[0]
+
+    def put(self, key: str, model: str, response: str, upload_path: Optional[str] = None) -> None:
+        """Store a completion, evicting the least recently used ones past max_bytes"""
+        if upload_path:
+            response = response.replace(upload_path, DOCUMENT_PLACEHOLDER)
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        try:
+            self._store(key, model, response, size)
+        except sqlite3.Error:
+            logger.warning("LLM cache store failed", exc_info=True)
+            self.errors += 1
+
+    def _store(self, key: str, model: str, response: str, size: int) -> None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                previous = connection.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO completions (key, model, response, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, size, now, now)
+                )
+                connection.execute(
+                    "UPDATE meta SET value = value + ? WHERE name = 'bytes'", (size - (previous[0] if previous else 0),)
+                )
+                total = connection.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+                while total > self.max_bytes:
+                    oldest = connection.execute(
+                        "SELECT key, size FROM completions WHERE key != ? ORDER BY last_used LIMIT 64", (key,)
+                    ).fetchall()
+                    if not oldest:
+                        break
+                    for old_key, old_size in oldest:
+                        connection.execute("DELETE FROM completions WHERE key = ?", (old_key,))
+                        total -= old_size
+                        self.evictions += 1
+                        if total <= self.max_bytes:
+                            break
+                    connection.execute("UPDATE meta SET value = ? WHERE name = 'bytes'", (total,))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            self.stores += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM completions")
+            connection.execute("UPDATE meta SET value = 0 WHERE name = 'bytes'")
+            connection.execute("COMMIT")
+
+    def stats(self) -> dict:
+        with self._lock:
+            connection = self._connect()
+            entries = connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            size = connection.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+llm_cache = CompletionCache()
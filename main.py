@@ -1,147 +1,1150 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional
 import os
+import asyncio
+import logging
 import uuid
 import json
-from datetime import datetime
+import hashlib
+import zipfile
+import zlib
+import time
+import base64
+from datetime import datetime, timedelta, timezone
 
-from crewai import Crew, Process
-from agents import financial_analyst , verifier , investment_advisor , risk_assessor
-from task import analyze_financial_document
-from db import engine, SessionLocal
-from models import Base, AnalysisResult
+from pydantic import BaseModel, Field
+from sqlalchemy import tuple_
+from sqlalchemy.orm import defer
 
-app = FastAPI(title="Financial Document Analyzer")
+from documents import document_cache, document_index, normalized_metrics, quick_analysis
+from db import SessionLocal, create_tables, db_writer
+from models import AnalysisResult, AnalysisJob, FinancialMetrics
+from jobs import JobQueue, JobQueueFull
+from ratelimit import llm_limiter
+from llm_cache import llm_cache
+from crew_pool import CrewPool
+from streaming import ProgressStream, sse
+from report import run_full_report, report_status, merge_report
+from screening import screening_store, ScreenExpressionError
+from telemetry import StageTimings, listen_path, pop_path_timings, prometheus_payload, PROMETHEUS_CONTENT_TYPE
 
-# Create the database tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-async def run_crew(query: str, file_path: str="data/sample.pdf"):
-    """To run the whole crew asynchronously using kickoff_async"""
-    financial_crew = Crew(
-        agents=[financial_analyst,verifier, investment_advisor, risk_assessor],
+# How long a stored analysis can be served again for the same document and query (0 disables)
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+# Compact storage: zlib-compress analysis bodies in the database
+COMPRESS_ANALYSES = os.getenv("COMPRESS_ANALYSES", "false").lower() in ("1", "true", "yes")
+# Also keep a pretty-printed JSON copy of every analysis under outputs/ (duplicates the database)
+WRITE_OUTPUT_FILES = os.getenv("WRITE_OUTPUT_FILES", "true").lower() in ("1", "true", "yes")
+
+def analysis_columns(analysis: str) -> dict:
+    """AnalysisResult column values holding an analysis body, compressed in compact storage mode"""
+    if COMPRESS_ANALYSES:
+        return {"analysis": None, "analysis_compressed": zlib.compress(analysis.encode("utf-8"))}
+    return {"analysis": analysis}
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a cache key"""
+    return " ".join(query.split()).lower()
+
+def result_cache_key(document_hash: str, query: str, mode: str = "standard") -> str:
+    """Content address of a (document, query, mode) pair; standard-mode keys omit the mode"""
+    key = f"{document_hash}\n{normalize_query(query)}"
+    if mode != "standard":
+        key += f"\n{mode}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def find_cached_result(cache_key: str):
+    """Most recent successful analysis for cache_key that is still within the TTL"""
+    if RESULT_CACHE_TTL_SECONDS <= 0:
+        return None
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=RESULT_CACHE_TTL_SECONDS)
+    db = SessionLocal()
+    try:
+        return (
+            db.query(AnalysisResult)
+            .filter(
+                AnalysisResult.cache_key == cache_key,
+                AnalysisResult.result == "success",
+                AnalysisResult.created_at >= cutoff,
+            )
+            .order_by(AnalysisResult.created_at.desc())
+            .first()
+        )
+    finally:
+        db.close()
+
+# Uploads and JSON outputs; absolute so every worker process (and the job queue) agrees on them
+DATA_DIR = os.path.abspath(os.getenv("DATA_DIR", "data"))
+OUTPUT_DIR = os.path.abspath(os.getenv("OUTPUT_DIR", "outputs"))
+# Uploads are streamed to disk in chunks of this size and rejected past MAX_UPLOAD_BYTES
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Room for multipart framing and form fields on top of MAX_UPLOAD_BYTES in a single-upload request body
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+# Endpoints taking one PDF, whose Content-Length is checked before the body is received
+SINGLE_UPLOAD_PATHS = ("/analyze", "/analyze/stream", "/jobs")
+# Crew runs in flight at once across all batch requests of this process
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Most documents accepted in one batch, counting PDFs inside zip archives
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+DEFAULT_QUERY = "Analyze this financial document for investment insights"
+# standard: the analyst's single task; full: verification, investment and risk tasks run concurrently;
+# quick: tool metrics and risk level only, no crew or LLM
+ANALYSIS_MODES = ("standard", "full", "quick")
+# Seconds an analysis may run once its upload is saved when the client names no deadline,
+# and the most a client may ask for (deadline_seconds form field or X-Deadline-Seconds header)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "600"))
+MAX_REQUEST_DEADLINE_SECONDS = float(os.getenv("MAX_REQUEST_DEADLINE_SECONDS", "900"))
+# How often a running /analyze request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+# Import crewai and build the crew pool in the background at startup instead of on the first analysis
+CREW_PREWARM = os.getenv("CREW_PREWARM", "false").lower() in ("1", "true", "yes")
+
+def load_crew_components():
+    """Import crewai, the agents and the task on first use.
+
+    crewai takes seconds to import and the agents need the LLM keys, so the
+    API starts (and serves health checks, metrics and cached results) without them.
+    """
+    from crewai import Crew, Process
+    from agents import financial_analyst, verifier, investment_advisor, risk_assessor
+    from task import analyze_financial_document
+    return Crew, Process, [financial_analyst, verifier, investment_advisor, risk_assessor], analyze_financial_document
+
+def build_crew_template():
+    """Crew the pool copies its crews from; it is never run itself"""
+    Crew, Process, agents, analyze_financial_document = load_crew_components()
+    return Crew(
+        agents=agents,
         tasks=[analyze_financial_document],
         process=Process.sequential,
     )
-    result = await financial_crew.kickoff_async({
+
+crew_pool = CrewPool(build_crew_template)
+
+async def run_crew(query: str, file_path: str="data/sample.pdf", progress: Optional[ProgressStream] = None,
+                   bypass_llm_cache: bool = False):
+    """To run a pooled crew asynchronously using kickoff_async"""
+    result = await crew_pool.kickoff({
         'query': query, 
         'file_path': file_path  # This ensures the file path reaches the task
-    })
+    }, progress=progress, bypass_llm_cache=bypass_llm_cache)
     return result
 
-@app.get("/")
-async def root():
-    """Health check endpoint"""
-    return {"message": "Financial Document Analyzer API is running"}
+def validate_mode(mode: Optional[str]) -> str:
+    """The requested analysis mode, standard when omitted"""
+    mode = (mode or "standard").lower()
+    if mode not in ANALYSIS_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode. Choose one of: {', '.join(ANALYSIS_MODES)}.")
+    return mode
 
-@app.post("/analyze")
-async def analyze_financial_document_endpoint(
-    file: UploadFile = File(...),
-    query: str = Form(default="Analyze this financial document for investment insights")
-):
-    """Analyze financial document and provide comprehensive investment recommendations"""
+def resolve_deadline(deadline_seconds: Optional[float], header_deadline: Optional[float]) -> float:
+    """Seconds the analysis may run: the form field, else the header, else the default; capped at the server max"""
+    requested = deadline_seconds if deadline_seconds is not None else header_deadline
+    if requested is None:
+        requested = REQUEST_DEADLINE_SECONDS
+    if not requested > 0:
+        raise HTTPException(status_code=400, detail="Deadline must be a positive number of seconds.")
+    return min(requested, MAX_REQUEST_DEADLINE_SECONDS)
 
-    data_dir = "data"
-    file_id = str(uuid.uuid4())
-    file_path = os.path.join(data_dir, f"financial_document_{file_id}.pdf")
+class AnalysisAborted(Exception):
+    """An analysis stopped before finishing: status is timeout (deadline passed) or cancelled (client left)"""
+
+    def __init__(self, status: str, deadline: float):
+        self.status = status
+        self.deadline = deadline
+        if status == "timeout":
+            detail = f"Analysis did not finish within the {deadline:g} second deadline."
+        else:
+            detail = "Client disconnected; analysis cancelled."
+        super().__init__(detail)
 
+    @property
+    def status_code(self) -> int:
+        # 499 (client closed request) is only ever seen in logs: the client is gone
+        return 504 if self.status == "timeout" else 499
+
+def ensure_data_dir():
+    """Create the upload directory if needed and check it is writable"""
+    if not os.path.exists(DATA_DIR):
+        try:
+            os.makedirs(DATA_DIR, exist_ok=True)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error creating data directory: {str(e)}")
+    if not os.access(DATA_DIR, os.W_OK):
+        raise HTTPException(status_code=500, detail=f"Data directory is not writable: {DATA_DIR}")
+
+def _write_chunk(f, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+async def save_pdf_upload(file: UploadFile, file_path: str) -> str:
+    """Stream a PDF upload to file_path in fixed-size chunks and return its SHA-256.
+
+    The magic bytes, running hash and size limit are checked as chunks arrive,
+    so memory per upload stays at one chunk whatever the file size.
+    """
+    # Validate the uploaded file type
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are supported.")
+
+    # Read a small chunk to validate it's a PDF
+    header = await file.read(5)
+    if header != b"%PDF-":
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid PDF.")
+
+    digest = hashlib.sha256()
+    size = len(header)
+    with open(file_path, "wb") as f:
+        _write_chunk(f, digest, header)
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Uploaded file exceeds the {MAX_UPLOAD_BYTES} byte limit."
+                )
+            # Hashing and writing release the GIL, so keep them off the event loop
+            await asyncio.to_thread(_write_chunk, f, digest, chunk)
+    return digest.hexdigest()
+
+class UploadSizeLimit:
+    """ASGI middleware: 413 for a single-upload request whose Content-Length is over the limit.
+
+    Starlette receives the whole multipart body (spooling it to a temporary
+    file) before an endpoint runs, so save_pdf_upload's own check only fires
+    once an oversized upload has been received. This one refuses it from the
+    headers. Chunked bodies carry no length and still rely on save_pdf_upload.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in SINGLE_UPLOAD_PATHS:
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Uploaded file exceeds the {MAX_UPLOAD_BYTES} byte limit."},
+                    headers={"Connection": "close"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+def copy_pdf_stream(src, file_path: str) -> str:
+    """Blocking counterpart of save_pdf_upload for file-like sources such as zip members"""
+    header = src.read(5)
+    if header != b"%PDF-":
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid PDF.")
+
+    digest = hashlib.sha256()
+    size = len(header)
+    with open(file_path, "wb") as f:
+        _write_chunk(f, digest, header)
+        for chunk in iter(lambda: src.read(UPLOAD_CHUNK_SIZE), b""):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Uploaded file exceeds the {MAX_UPLOAD_BYTES} byte limit."
+                )
+            _write_chunk(f, digest, chunk)
+    return digest.hexdigest()
+
+def remove_upload(file_path: str):
+    """Delete a saved upload, ignoring errors"""
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except Exception:
+            pass  # Ignore cleanup error
+
+def write_output_file(output_file: str, output_data: dict) -> None:
+    """Save an analysis as pretty-printed JSON under outputs/"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(output_data, f, indent=2)
+
+def build_document_index(file_path: str) -> Optional[dict]:
+    """Parse and chunk-index a saved upload before the crew searches it; return its size"""
     try:
-        # Ensure data directory exists
-        if not os.path.exists(data_dir):
-            try:
-                os.makedirs(data_dir, exist_ok=True)
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error creating data directory: {str(e)}")
-        if not os.access(data_dir, os.W_OK):
-            raise HTTPException(status_code=500, detail=f"Data directory is not writable: {data_dir}")
+        index = document_index(file_path)
+        return {"pages": len(document_cache.get(file_path).pages), "chunks": len(index.chunks)}
+    except Exception:
+        # The search tool reports the problem to the agent instead
+        logger.exception("Indexing failed for %s", file_path)
+        return None
 
-        # Validate the uploaded file type
-        if not file.filename.lower().endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are supported.")
+def extract_metrics(file_path: str) -> Optional[dict]:
+    """Normalized tool metrics for a saved upload, or None if extraction fails"""
+    try:
+        return normalized_metrics(document_cache.get(file_path))
+    except Exception:
+        logger.exception("Metric extraction failed for %s", file_path)
+        return None
 
-        # Read a small chunk to validate it's a PDF
-        header = await file.read(5)
-        if header != b"%PDF-":
-            raise HTTPException(status_code=400, detail="Uploaded file is not a valid PDF.")
+def quick_summary(file_path: str, document_hash: str) -> dict:
+    """quick_analysis of a saved upload, parsed through the shared document cache"""
+    document = document_cache.get(file_path, digest=document_hash)
+    if not document.pages:
+        raise HTTPException(status_code=422, detail="No text content found in the PDF.")
+    summary = quick_analysis(document)
+    lines = summary["investment_insights"] + summary["risk"]["factors"]
+    lines.append(f"Risk Level: {summary['risk']['level'] or 'Unknown'}")
+    return {"analysis": "\n".join(lines), **summary}
 
-        rest = await file.read()  # read the rest of the file
-        content = header + rest  # combine header and rest
+async def quick_analyze(
+    file_path: str,
+    file_processed: str,
+    query: str,
+    document_hash: str,
+    timings: Optional[StageTimings] = None
+) -> dict:
+    """LLM-free analysis: the tools' metrics and risk assessment, straight from the parsed document.
 
-        # Save uploaded file
-        with open(file_path, "wb") as f:
-            f.write(content)
+    Nothing is stored: the result is cheaper to recompute (the parse is cached)
+    than to persist, and this path must keep up with high request rates.
+    """
+    timings = timings or StageTimings()
+    try:
+        with timings.stage("quick_extract"):
+            summary = await asyncio.to_thread(quick_summary, file_path, document_hash)
+    finally:
+        remove_upload(file_path)
+        pop_path_timings(file_path)
+    return {
+        "status": "success",
+        "mode": "quick",
+        "query": query,
+        "file_processed": file_processed,
+        "cached": False,
+        **summary
+    }
 
-        # Validate query
-        if not query:
-            query = "Analyze this financial document for investment insights"
+async def process_document(
+    file_path: str,
+    file_processed: str,
+    query: str,
+    file_id: str,
+    document_hash: str,
+    cache_key: str,
+    timings: Optional[StageTimings] = None,
+    progress: Optional[ProgressStream] = None,
+    mode: str = "standard",
+    bypass_llm_cache: bool = False,
+    keep_upload_on_cancel: bool = False
+) -> dict:
+    """Run the crew on a saved upload, persist the result and remove the upload.
 
-        # Process the financial document with all analysts
-        response = await run_crew(query=query.strip(), file_path=file_path)
+    keep_upload_on_cancel leaves the upload in place when the run is cancelled,
+    for a queued job that another worker will run again.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError("The uploaded document is no longer available.")
+    timings = timings or StageTimings()
+    if progress is not None:
+        listen_path(file_path, progress.timing)
+    cancelled = False
+    try:
+        # Parse and index the document once, so every search tool call only ranks chunks
+        with timings.stage("index_build"):
+            parsed = await asyncio.to_thread(build_document_index, file_path)
+        if progress is not None:
+            progress.emit("parsed", parsed or {"pages": 0, "chunks": 0})
+
+        report = None
+        with timings.stage("crew"):
+            if mode == "full":
+                # Verification, investment and risk sections at once, each on its own pooled crew
+                report = await run_full_report(query.strip(), file_path, timings=timings, progress=progress,
+                                               bypass_llm_cache=bypass_llm_cache)
+            else:
+                # Process the financial document with all analysts
+                response = await run_crew(query=query.strip(), file_path=file_path, progress=progress,
+                                          bypass_llm_cache=bypass_llm_cache)
+        if report is not None:
+            result_status = report_status(report)
+            if result_status == "error":
+                raise RuntimeError("; ".join(f"{name}: {entry['detail']}" for name, entry in report.items()))
+            response = merge_report(report)
+        else:
+            result_status = "success"
+
+        # Extract typed metrics while the upload is still on disk (the parse is already cached)
+        with timings.stage("metrics_extract"):
+            metrics = await asyncio.to_thread(extract_metrics, file_path)
+        # PDF parse and tool call durations recorded while the crew ran
+        timings.collect(file_path)
 
-        # Save output to outputs folder
-        output_dir = "outputs"
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-        
         # Create output filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"{output_dir}/analysis_{timestamp}_{file_id}.json"
-        
-        # Set result status
-        result_status = "success"
+        output_file = f"{OUTPUT_DIR}/analysis_{timestamp}_{file_id}.json"
 
         # Save analysis results
         output_data = {
             "timestamp": timestamp,
             "query": query,
-            "file_processed": file.filename,
+            "file_processed": file_processed,
             "analysis": str(response),
             "file_id": file_id,
             "result": result_status
         }
+        if report is not None:
+            output_data["report"] = report
         
-        with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2)
+        # Save output to outputs folder, off the event loop
+        if WRITE_OUTPUT_FILES:
+            with timings.stage("output_write"):
+                await asyncio.to_thread(write_output_file, output_file, output_data)
 
-        # Save analysis result to database only if success
-        if result_status == "success":
-            db = SessionLocal()
-            try:
-                db_result = AnalysisResult(
-                    timestamp=timestamp,
-                    query=query,
-                    file_processed=file.filename,
-                    analysis=str(response),
+        # Save analysis result to database (partial reports too; only successes are served from cache)
+        if result_status in ("success", "partial"):
+            # Timings up to this point; the commit itself is only exported as a metric
+            stage_timings = json.dumps(timings.as_dict())
+            rows = [AnalysisResult(
+                timestamp=timestamp,
+                query=query,
+                file_processed=file_processed,
+                file_id=file_id,
+                result=result_status,
+                document_hash=document_hash,
+                cache_key=cache_key,
+                stage_timings=stage_timings,
+                report=json.dumps(report) if report is not None else None,
+                **analysis_columns(str(response))
+            )]
+            if metrics is not None:
+                rows.append(FinancialMetrics(
                     file_id=file_id,
-                    result=result_status
-                )
-                db.add(db_result)
-                db.commit()
-            finally:
-                db.close()
+                    document_hash=document_hash,
+                    file_processed=file_processed,
+                    **metrics
+                ))
+            # Committed by the write-behind thread; waiting keeps the response durable
+            with timings.stage("db_commit"):
+                await asyncio.wrap_future(db_writer.write(*rows))
 
-        # Clean up uploaded file after processing is complete
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass  # Ignore cleanup error
-
-        return {
+        output = {
             "status": result_status,
             "query": query,
             "analysis": str(response),
-            "file_processed": file.filename
+            "file_processed": file_processed,
+            "cached": False
         }
+        if report is not None:
+            output["mode"] = mode
+            output["report"] = report
+        return output
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        # Clean up uploaded file after processing is complete
+        if not (cancelled and keep_upload_on_cancel):
+            remove_upload(file_path)
+        listen_path(file_path, None)
+        pop_path_timings(file_path)
 
-    except Exception as e:
-        # Clean up uploaded file
-        if os.path.exists(file_path):
+async def analyze_saved_upload(
+    file_path: str,
+    file_processed: str,
+    query: str,
+    file_id: str,
+    document_hash: str,
+    force_refresh: bool = False,
+    timings: Optional[StageTimings] = None,
+    progress: Optional[ProgressStream] = None,
+    mode: str = "standard"
+) -> dict:
+    """Serve a stored analysis of the same document, query and mode, or run the crew on the upload"""
+    if mode == "quick":
+        return await quick_analyze(file_path, file_processed, query, document_hash, timings)
+    cache_key = result_cache_key(document_hash, query, mode)
+    if not force_refresh:
+        cached = await asyncio.to_thread(find_cached_result, cache_key)
+        if cached is not None:
+            remove_upload(file_path)
+            output = {
+                "status": cached.result,
+                "query": query,
+                "analysis": cached.analysis_text,
+                "file_processed": file_processed,
+                "cached": True
+            }
+            if cached.report is not None:
+                output["mode"] = mode
+                output["report"] = json.loads(cached.report)
+            return output
+
+    return await process_document(
+        file_path=file_path,
+        file_processed=file_processed,
+        query=query,
+        file_id=file_id,
+        document_hash=document_hash,
+        cache_key=cache_key,
+        timings=timings,
+        progress=progress,
+        mode=mode,
+        # A forced refresh should not be answered from cached completions either
+        bypass_llm_cache=force_refresh
+    )
+
+async def run_until_deadline(request: Request, analysis, deadline: float):
+    """Await the analysis coroutine, cancelling it once deadline seconds pass or the client disconnects.
+
+    Cancelling stops its crew at the next LLM call and removes its upload;
+    AnalysisAborted is raised once that cleanup has run.
+    """
+    task = asyncio.ensure_future(analysis)
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline
+    try:
+        while True:
+            remaining = expires - loop.time()
+            if remaining <= 0:
+                status = "timeout"
+                break
+            done, _ = await asyncio.wait({task}, timeout=min(DISCONNECT_POLL_SECONDS, remaining))
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                status = "cancelled"
+                break
+    finally:
+        if not task.done():
+            task.cancel()
+    await asyncio.wait({task})
+    raise AnalysisAborted(status, deadline)
+
+def record_aborted_analysis(error: AnalysisAborted, file_id: str, file_processed: str, query: str,
+                            document_hash: str, mode: str, timings: StageTimings):
+    """Queue an AnalysisResult with the timeout/cancelled status of an analysis that never finished"""
+    return db_writer.write(AnalysisResult(
+        timestamp=datetime.now().strftime("%Y%m%d_%H%M%S"),
+        query=query,
+        file_processed=file_processed,
+        file_id=file_id,
+        result=error.status,
+        document_hash=document_hash,
+        cache_key=result_cache_key(document_hash, query, mode),
+        stage_timings=json.dumps(timings.as_dict()),
+        **analysis_columns(str(error))
+    ))
+
+async def run_job(job: AnalysisJob) -> str:
+    """Job queue handler: analyze the upload saved for a queued job"""
+    response = await process_document(
+        file_path=job.file_path,
+        file_processed=job.file_processed,
+        query=job.query,
+        file_id=job.id,
+        document_hash=job.document_hash,
+        cache_key=job.cache_key,
+        bypass_llm_cache=job.force_refresh,
+        keep_upload_on_cancel=True
+    )
+    return response["analysis"]
+
+job_queue = JobQueue(handler=run_job)
+
+def log_prewarm_failure(task: asyncio.Task) -> None:
+    """Done-callback of the startup prewarm: log its error (the first analysis builds the pool instead)"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Crew pool prewarm failed", exc_info=task.exception())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the database tables and run the background job workers for the lifetime of the app"""
+    await asyncio.to_thread(create_tables)
+    # Keep a reference so the prewarm task is not garbage-collected while it runs
+    prewarm = asyncio.create_task(crew_pool.start()) if CREW_PREWARM else None
+    if prewarm is not None:
+        prewarm.add_done_callback(log_prewarm_failure)
+    db_writer.start()
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        if prewarm is not None and not prewarm.done():
+            prewarm.cancel()
+            await asyncio.gather(prewarm, return_exceptions=True)
+        await job_queue.stop()
+        # Flush results still queued for the database before the process exits
+        await asyncio.to_thread(db_writer.stop)
+
+app = FastAPI(title="Financial Document Analyzer", lifespan=lifespan)
+app.add_middleware(UploadSizeLimit)
+
+@app.get("/")
+async def root():
+    """Health check endpoint"""
+    return {"message": "Financial Document Analyzer API is running"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and memory usage of the parsed-document cache"""
+    return {"document_cache": document_cache.stats()}
+
+@app.get("/crew/pool")
+async def crew_pool_stats():
+    """Size, idle crews and waiting requests of the crew pool"""
+    return crew_pool.stats()
+
+@app.get("/llm/limits")
+async def llm_limits():
+    """Current levels of the shared LLM request/token buckets and queueing statistics"""
+    return await asyncio.to_thread(llm_limiter.snapshot)
+
+@app.get("/llm/cache")
+async def llm_cache_stats():
+    """Entries, size and hit rate of the shared LLM completion cache"""
+    return await asyncio.to_thread(llm_cache.stats)
+
+@app.get("/metrics/prometheus")
+def prometheus_metrics():
+    """Stage, tool and LLM latency histograms and LLM call/token counters in Prometheus format"""
+    return Response(content=prometheus_payload(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.post("/analyze")
+async def analyze_financial_document_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    query: str = Form(default=DEFAULT_QUERY),
+    force_refresh: bool = Form(default=False),
+    mode: Optional[str] = Form(default=None),
+    mode_param: Optional[str] = Query(default=None, alias="mode", description="Used when the form has no mode"),
+    deadline_seconds: Optional[float] = Form(default=None),
+    x_deadline_seconds: Optional[float] = Header(default=None)
+):
+    """Analyze financial document and provide comprehensive investment recommendations.
+
+    mode=full runs the verification, investment and risk tasks concurrently and
+    returns their outputs per section under "report" as well as merged.
+    mode=quick skips the crew and returns the tools' metrics and risk level.
+    mode is read from the form, else from the query string (?mode=quick).
+    An analysis still running at its deadline returns 504; one whose client
+    disconnects is stopped. Either is recorded with that status.
+    """
+    mode = validate_mode(mode or mode_param)
+    deadline = resolve_deadline(deadline_seconds, x_deadline_seconds)
+    file_id = str(uuid.uuid4())
+    file_path = os.path.join(DATA_DIR, f"financial_document_{file_id}.pdf")
+    timings = StageTimings()
+
+    try:
+        ensure_data_dir()
+        # Save uploaded file
+        with timings.stage("upload"):
+            document_hash = await save_pdf_upload(file, file_path)
+
+        # Validate query
+        if not query:
+            query = DEFAULT_QUERY
+
+        return await run_until_deadline(request, analyze_saved_upload(
+            file_path=file_path,
+            file_processed=file.filename,
+            query=query,
+            file_id=file_id,
+            document_hash=document_hash,
+            force_refresh=force_refresh,
+            timings=timings,
+            mode=mode
+        ), deadline)
+
+    except AnalysisAborted as e:
+        remove_upload(file_path)
+        logger.warning("Analysis of %s %s", file.filename, e.status)
+        # Quick mode stores nothing, finished or not
+        if mode != "quick":
             try:
-                os.remove(file_path)
+                await asyncio.wrap_future(record_aborted_analysis(
+                    e, file_id, file.filename, query, document_hash, mode, timings
+                ))
             except Exception:
-                pass  # Ignore cleanup error
+                logger.exception("Could not record the %s analysis of %s", e.status, file.filename)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except HTTPException:
+        remove_upload(file_path)
+        raise
+    except Exception as e:
+        # Clean up uploaded file
+        remove_upload(file_path)
         raise HTTPException(status_code=500, detail=f"Error processing financial document: {str(e)}")
 
+@app.post("/analyze/stream")
+async def analyze_stream_endpoint(
+    file: UploadFile = File(...),
+    query: str = Form(default=DEFAULT_QUERY),
+    force_refresh: bool = Form(default=False),
+    mode: Optional[str] = Form(default=None),
+    mode_param: Optional[str] = Query(default=None, alias="mode", description="Used when the form has no mode"),
+    deadline_seconds: Optional[float] = Form(default=None),
+    x_deadline_seconds: Optional[float] = Header(default=None)
+):
+    """Analyze a financial document, streaming progress as server-sent events.
+
+    Events: accepted, parsed, stage, tool (with its duration), llm_call,
+    answer (final-answer text as the LLM generates it), section (mode=full,
+    as each report section finishes), then result or error (with status
+    timeout when the deadline passes). Disconnecting stops the analysis.
+    mode is read from the form, else from the query string.
+    """
+    mode = validate_mode(mode or mode_param)
+    deadline = resolve_deadline(deadline_seconds, x_deadline_seconds)
+    file_id = str(uuid.uuid4())
+    file_path = os.path.join(DATA_DIR, f"financial_document_{file_id}.pdf")
+    timings = StageTimings()
+
+    try:
+        ensure_data_dir()
+        with timings.stage("upload"):
+            document_hash = await save_pdf_upload(file, file_path)
+    except HTTPException:
+        remove_upload(file_path)
+        raise
+    if not query:
+        query = DEFAULT_QUERY
+
+    progress = ProgressStream()
+
+    def record_aborted(error: AnalysisAborted):
+        logger.warning("Streaming analysis of %s %s", file.filename, error.status)
+        if mode != "quick":
+            record_aborted_analysis(error, file_id, file.filename, query, document_hash, mode, timings)
+
+    async def analyze():
+        try:
+            result = await asyncio.wait_for(analyze_saved_upload(
+                file_path=file_path,
+                file_processed=file.filename,
+                query=query,
+                file_id=file_id,
+                document_hash=document_hash,
+                force_refresh=force_refresh,
+                timings=timings,
+                progress=progress,
+                mode=mode
+            ), deadline)
+            progress.emit("result", result)
+        except asyncio.TimeoutError:
+            error = AnalysisAborted("timeout", deadline)
+            record_aborted(error)
+            progress.emit("error", {"status": error.status, "detail": str(error)})
+        except Exception as e:
+            logger.exception("Streaming analysis failed for %s", file.filename)
+            progress.emit("error", {"detail": f"Error processing financial document: {str(e)}"})
+        finally:
+            progress.close()
+
+    async def events():
+        yield sse("accepted", {"file_id": file_id, "file_processed": file.filename, "query": query})
+        task = asyncio.create_task(analyze())
+        try:
+            async for event, data in progress.events():
+                yield sse(event, data)
+        finally:
+            if not task.done():
+                # Client disconnected: stop the analysis (and its crew), drop its upload and record it
+                task.cancel()
+                record_aborted(AnalysisAborted("cancelled", deadline))
+            remove_upload(file_path)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def extract_zip_pdfs(archive_file, archive_name: str, items: List[dict]) -> None:
+    """Save every PDF in a zip upload to the data directory, appending a batch item for each"""
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except zipfile.BadZipFile:
+        items.append({"file_processed": archive_name, "error": "Invalid zip archive."})
+        return
+
+    with archive:
+        for info in archive.infolist():
+            member = os.path.basename(info.filename)
+            # Skip folders, non-PDFs and macOS resource forks
+            if info.is_dir() or not member.lower().endswith(".pdf") or member.startswith("._"):
+                continue
+            if len(items) > BATCH_MAX_FILES:
+                break  # Enough to know the batch is too large
+            items.append(save_batch_item(
+                f"{archive_name}/{info.filename}",
+                lambda path, info=info: copy_zip_member(archive, info, path)
+            ))
+
+def copy_zip_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, file_path: str) -> str:
+    """copy_pdf_stream of one archive member, closing the member's stream afterwards"""
+    with archive.open(info) as src:
+        return copy_pdf_stream(src, file_path)
+
+def save_batch_item(file_processed: str, save) -> dict:
+    """Run save(file_path) for a new upload id, recording validation and read errors on the item"""
+    file_id = str(uuid.uuid4())
+    file_path = os.path.join(DATA_DIR, f"financial_document_{file_id}.pdf")
+    try:
+        document_hash = save(file_path)
+    except HTTPException as e:
+        remove_upload(file_path)
+        return {"file_processed": file_processed, "error": e.detail}
+    except (zipfile.BadZipFile, zlib.error, RuntimeError, OSError) as e:
+        # Corrupt data, bad CRC or an encrypted member: this document fails, not the batch
+        remove_upload(file_path)
+        return {"file_processed": file_processed, "error": f"Unreadable archive member: {e}"}
+    return {
+        "file_processed": file_processed,
+        "file_id": file_id,
+        "file_path": file_path,
+        "document_hash": document_hash
+    }
+
+def remove_batch_uploads(items: List[dict]) -> None:
+    for item in items:
+        if "file_path" in item:
+            remove_upload(item["file_path"])
+
+async def save_batch_uploads(files: List[UploadFile]) -> List[dict]:
+    """Save all PDFs of a batch (zip archives are expanded) before analysis starts"""
+    items = []
+    try:
+        for upload in files:
+            if upload.filename.lower().endswith(".zip"):
+                await asyncio.to_thread(extract_zip_pdfs, upload.file, upload.filename, items)
+            else:
+                file_id = str(uuid.uuid4())
+                file_path = os.path.join(DATA_DIR, f"financial_document_{file_id}.pdf")
+                try:
+                    document_hash = await save_pdf_upload(upload, file_path)
+                    items.append({
+                        "file_processed": upload.filename,
+                        "file_id": file_id,
+                        "file_path": file_path,
+                        "document_hash": document_hash
+                    })
+                except HTTPException as e:
+                    remove_upload(file_path)
+                    items.append({"file_processed": upload.filename, "error": e.detail})
+
+            if len(items) > BATCH_MAX_FILES:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_FILES} documents.")
+    except BaseException:
+        # Nothing is analyzed after a failed save (or a cancelled request): leave no uploads behind
+        remove_batch_uploads(items)
+        raise
+    return items
+
+async def analyze_batch_item(index: int, item: dict, query: str, force_refresh: bool) -> dict:
+    """Analyze one batch document; failures are reported on the item, never raised"""
+    result = {"index": index, "file_processed": item["file_processed"]}
+    if "error" in item:
+        return {**result, "status": "error", "detail": item["error"]}
+
+    async with batch_semaphore:
+        try:
+            response = await analyze_saved_upload(
+                file_path=item["file_path"],
+                file_processed=item["file_processed"],
+                query=query,
+                file_id=item["file_id"],
+                document_hash=item["document_hash"],
+                force_refresh=force_refresh
+            )
+            return {**result, **response}
+        except Exception as e:
+            logger.exception("Batch analysis failed for %s", item["file_processed"])
+            return {**result, "status": "error", "detail": f"Error processing financial document: {str(e)}"}
+        finally:
+            remove_upload(item["file_path"])
+
+batch_semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+@app.post("/analyze/batch")
+async def analyze_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    query: str = Form(default=DEFAULT_QUERY),
+    force_refresh: bool = Form(default=False)
+):
+    """Analyze many PDFs (or zip archives of PDFs) with one shared query.
+
+    Streams one JSON line per document as its analysis finishes, then a
+    summary line. A document that fails is reported on its line and does
+    not affect the rest of the batch.
+    """
+    ensure_data_dir()
+    if not query:
+        query = DEFAULT_QUERY
+
+    items = await save_batch_uploads(files)
+
+    async def results():
+        tasks = [
+            asyncio.create_task(analyze_batch_item(index, item, query, force_refresh))
+            for index, item in enumerate(items)
+        ]
+        succeeded = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                succeeded += result["status"] == "success"
+                yield json.dumps(result) + "\n"
+            yield json.dumps({"done": True, "total": len(items), "succeeded": succeeded,
+                              "failed": len(items) - succeeded}) + "\n"
+        finally:
+            # Client disconnected: stop outstanding analyses and drop their uploads
+            for task in tasks:
+                task.cancel()
+            for item in items:
+                if "file_path" in item:
+                    remove_upload(item["file_path"])
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+METRIC_FIELDS = (
+    "id", "file_id", "document_hash", "file_processed", "revenue", "net_income",
+    "margin_pct", "growth_pct", "cash_flow", "eps", "total_debt", "debt_to_equity",
+    "leverage", "decline_pct", "current_ratio", "risk_level"
+)
+
+@app.get("/metrics")
+def list_financial_metrics(
+    file_id: Optional[str] = None,
+    document_hash: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    min_revenue: Optional[float] = None,
+    max_revenue: Optional[float] = None,
+    after_id: Optional[int] = Query(default=None, description="Cursor: next_cursor of the previous page"),
+    limit: int = Query(default=50, ge=1, le=500)
+):
+    """Stored financial metrics of analyzed documents, keyset-paginated by id"""
+    db = SessionLocal()
+    try:
+        q = db.query(FinancialMetrics)
+        if file_id is not None:
+            q = q.filter(FinancialMetrics.file_id == file_id)
+        if document_hash is not None:
+            q = q.filter(FinancialMetrics.document_hash == document_hash)
+        if risk_level is not None:
+            q = q.filter(FinancialMetrics.risk_level == risk_level.title())
+        if min_revenue is not None:
+            q = q.filter(FinancialMetrics.revenue >= min_revenue)
+        if max_revenue is not None:
+            q = q.filter(FinancialMetrics.revenue <= max_revenue)
+        if after_id is not None:
+            q = q.filter(FinancialMetrics.id > after_id)
+        rows = q.order_by(FinancialMetrics.id).limit(limit + 1).all()
+    finally:
+        db.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = []
+    for row in rows:
+        item = {field: getattr(row, field) for field in METRIC_FIELDS}
+        item["created_at"] = row.created_at.isoformat() if row.created_at else None
+        items.append(item)
+    return {"items": items, "next_cursor": rows[-1].id if has_more else None}
+
+class ScreenRequest(BaseModel):
+    filter: Optional[str] = Field(default=None, description="Condition on metric columns, e.g. 'debt_to_equity > 2 and decline_pct > 10'")
+    rank: Optional[str] = Field(default=None, description="Numeric expression to order matches by, e.g. 'net_income / revenue'")
+    descending: bool = True
+    limit: int = Field(default=50, ge=1, le=1000)
+
+@app.post("/screen")
+def screen_documents(request: ScreenRequest):
+    """Screen every analyzed document's stored metrics, vectorized over memory-mapped columns.
+
+    Nothing is re-run: the store follows financial_metrics, picking up rows
+    added since the last screen. Matches are ranked by `rank` (missing scores
+    last) or returned newest first.
+    """
+    start = time.perf_counter()
+    try:
+        result = screening_store.screen(request.filter, request.rank, request.descending, request.limit)
+    except ScreenExpressionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+@app.get("/screen/stats")
+def screening_stats():
+    """Documents, size and counters of the screening store"""
+    return screening_store.stats()
+
+def encode_analysis_cursor(row: AnalysisResult) -> str:
+    return base64.urlsafe_b64encode(f"{row.created_at.isoformat()}|{row.id}".encode()).decode()
+
+def decode_analysis_cursor(cursor: str):
+    """(created_at, id) of an opaque cursor returned as next_cursor"""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+@app.get("/analyses")
+def list_analyses(
+    file_processed: Optional[str] = None,
+    query: Optional[str] = Query(default=None, description="Case-insensitive substring of the query text"),
+    include_analysis: bool = False,
+    cursor: Optional[str] = Query(default=None, description="Cursor: next_cursor of the previous page"),
+    limit: int = Query(default=20, ge=1, le=200)
+):
+    """Stored analyses, newest first, keyset-paginated by (created_at, id)"""
+    db = SessionLocal()
+    try:
+        q = db.query(AnalysisResult)
+        if not include_analysis:
+            # Leave the (possibly large) bodies in the database
+            q = q.options(defer(AnalysisResult.analysis), defer(AnalysisResult.analysis_compressed))
+        if file_processed is not None:
+            q = q.filter(AnalysisResult.file_processed == file_processed)
+        if query is not None:
+            q = q.filter(AnalysisResult.query.icontains(query, autoescape=True))
+        if cursor is not None:
+            q = q.filter(tuple_(AnalysisResult.created_at, AnalysisResult.id) < decode_analysis_cursor(cursor))
+        rows = (
+            q.order_by(AnalysisResult.created_at.desc(), AnalysisResult.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = []
+        for row in rows:
+            item = {
+                "id": row.id,
+                "file_id": row.file_id,
+                "file_processed": row.file_processed,
+                "query": row.query,
+                "result": row.result,
+                "document_hash": row.document_hash,
+                "created_at": row.created_at.isoformat() if row.created_at else None
+            }
+            if include_analysis:
+                item["analysis"] = row.analysis_text
+            items.append(item)
+    finally:
+        db.close()
+    return {"items": items, "next_cursor": encode_analysis_cursor(rows[-1]) if has_more else None}
+
+@app.get("/analyses/{file_id}")
+def get_analysis(file_id: str):
+    """One stored analysis with its body and stage timings"""
+    db = SessionLocal()
+    try:
+        row = db.query(AnalysisResult).filter(AnalysisResult.file_id == file_id).first()
+    finally:
+        db.close()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Analysis not found: {file_id}")
+    return {
+        "id": row.id,
+        "file_id": row.file_id,
+        "file_processed": row.file_processed,
+        "query": row.query,
+        "result": row.result,
+        "document_hash": row.document_hash,
+        "analysis": row.analysis_text,
+        "stage_timings": json.loads(row.stage_timings) if row.stage_timings else None,
+        "report": json.loads(row.report) if row.report else None,
+        "created_at": row.created_at.isoformat() if row.created_at else None
+    }
+
+def serialize_job(job: AnalysisJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "query": job.query,
+        "file_processed": job.file_processed,
+        "analysis": job.analysis,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+@app.post("/jobs", status_code=202)
+async def submit_analysis_job(
+    file: UploadFile = File(...),
+    query: str = Form(default=DEFAULT_QUERY),
+    force_refresh: bool = Form(default=False)
+):
+    """Queue a financial document for background analysis and return its job id immediately"""
+
+    # Refuse before saving the upload when the workers are already saturated
+    # (FastAPI has already received the request body by now; UploadSizeLimit checks the size earlier)
+    if await job_queue.is_full():
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later", headers={"Retry-After": "30"})
+
+    job_id = str(uuid.uuid4())
+    file_path = os.path.join(DATA_DIR, f"financial_document_{job_id}.pdf")
+
+    try:
+        ensure_data_dir()
+        document_hash = await save_pdf_upload(file, file_path)
+
+        if not query:
+            query = DEFAULT_QUERY
+
+        cache_key = result_cache_key(document_hash, query)
+        job = AnalysisJob(
+            id=job_id,
+            status="queued",
+            query=query,
+            file_processed=file.filename,
+            file_path=file_path,
+            document_hash=document_hash,
+            cache_key=cache_key,
+            force_refresh=force_refresh
+        )
+
+        # A cached analysis completes the job without queueing it
+        cached = None if force_refresh else await asyncio.to_thread(find_cached_result, cache_key)
+        if cached is not None:
+            job.status = "succeeded"
+            job.analysis = cached.analysis_text
+            job.finished_at = datetime.now(timezone.utc)
+            job.file_path = None
+            remove_upload(file_path)
+            await job_queue.record(job)
+            return {"job_id": job_id, "status": job.status}
+
+        await job_queue.submit(job)
+        return {"job_id": job_id, "status": job.status}
+
+    except JobQueueFull:
+        remove_upload(file_path)
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later", headers={"Retry-After": "30"})
+    except HTTPException:
+        remove_upload(file_path)
+        raise
+    except Exception as e:
+        remove_upload(file_path)
+        raise HTTPException(status_code=500, detail=f"Error queueing financial document: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Status of a background analysis job, with the analysis once it has succeeded"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return serialize_job(job)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
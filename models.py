@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+import zlib
+from typing import Optional
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Index, LargeBinary, Boolean
 from db import Base
 from datetime import datetime,timezone
 
@@ -9,6 +11,74 @@ class AnalysisResult(Base):
     query = Column(Text)
     file_processed = Column(String)
     analysis = Column(Text)
+    # zlib-compressed analysis body, used instead of `analysis` in compact storage mode
+    analysis_compressed = Column(LargeBinary)
     result=Column(Text)
     file_id = Column(String, unique=True, index=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
\ No newline at end of file
+    # SHA-256 of the uploaded PDF bytes, and of those bytes plus the normalized query
+    document_hash = Column(String(64), index=True)
+    cache_key = Column(String(64), index=True)
+    # JSON: per-stage seconds (upload, crew, pdf_parse, ...) and individual tool call durations
+    stage_timings = Column(Text)
+    # JSON: per-section status, output and seconds of a full-report (mode=full) analysis
+    report = Column(Text)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    __table_args__ = (
+        # Keyset pagination of GET /analyses, newest first, overall and per file name
+        Index("ix_analysis_results_created_at_id", "created_at", "id"),
+        Index("ix_analysis_results_file_processed_created_at_id", "file_processed", "created_at", "id"),
+    )
+
+    @property
+    def analysis_text(self) -> Optional[str]:
+        """Analysis body, decompressed when stored in compact form"""
+        if self.analysis_compressed is not None:
+            return zlib.decompress(self.analysis_compressed).decode("utf-8")
+        return self.analysis
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    id = Column(String(36), primary_key=True)
+    # queued -> running -> succeeded | failed
+    status = Column(String(16), index=True, nullable=False, default="queued")
+    query = Column(Text)
+    file_processed = Column(String)
+    file_path = Column(String)
+    document_hash = Column(String(64))
+    cache_key = Column(String(64))
+    # Skip the LLM completion cache when the job runs
+    force_refresh = Column(Boolean, nullable=False, default=False)
+    analysis = Column(Text)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class FinancialMetrics(Base):
+    """Normalized figures extracted from one analyzed document"""
+    __tablename__ = "financial_metrics"
+    id = Column(Integer, primary_key=True)
+    file_id = Column(String(36), unique=True, index=True, nullable=False)
+    document_hash = Column(String(64), index=True)
+    file_processed = Column(String)
+    # Currency amounts in units (e.g. 1.2e9 for "$1.2 billion"), percentages in percent
+    revenue = Column(Float, index=True)
+    net_income = Column(Float)
+    margin_pct = Column(Float)
+    growth_pct = Column(Float)
+    cash_flow = Column(Float)
+    eps = Column(Float)
+    total_debt = Column(Float)
+    debt_to_equity = Column(Float)
+    leverage = Column(Float)
+    decline_pct = Column(Float)
+    current_ratio = Column(Float)
+    risk_level = Column(String(8))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    __table_args__ = (
+        # Serves the common "filter by risk level, page by id" dashboard query
+        Index("ix_financial_metrics_risk_level_id", "risk_level", "id"),
+    )
@@ -0,0 +1,115 @@
+## Streaming, page-parallel PDF text extraction
+# Kept free of crewai/langchain imports so process-pool workers start quickly.
+import os
+import re
+import atexit
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional
+
+from pypdf import PdfReader
+
+# Documents with more pages than this are extracted across a process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+# Size of that pool (defaults to the number of cores)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# Pages handed to a worker per task
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+_BLANK_LINES = re.compile(r"\n{2,}")
+
+def normalize_page(content: str) -> str:
+    """Collapse runs of blank lines in a page of extracted text"""
+    return _BLANK_LINES.sub("\n", content)
+
+def _page_text(page) -> str:
+    # Same extraction PyPDFLoader performs for a page without images
+    return page.extract_text(extraction_mode="plain").strip()
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Process-pool task: text of pages [start, stop) of the PDF at path"""
+    reader = PdfReader(path)
+    return [_page_text(reader.pages[number]) for number in range(start, stop)]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process runs threads that a forked child could deadlock on
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+def _iter_parallel(path: str, page_count: int) -> Iterator[str]:
+    """Yield page texts in order while workers extract the following page ranges"""
+    pool = _get_pool()
+    ranges = deque(
+        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    )
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            # Keep two tasks per worker queued so cores stay busy without extracting far ahead
+            while ranges and len(in_flight) < 2 * PDF_EXTRACT_WORKERS:
+                in_flight.append(pool.submit(_extract_page_range, path, *ranges.popleft()))
+            yield from in_flight.popleft().result()
+    except BrokenProcessPool:
+        # A worker died; build a fresh pool on the next call
+        global _pool
+        with _pool_lock:
+            _pool = None
+        raise
+    finally:
+        # Early stop (or error): drop work nobody will read
+        for future in in_flight:
+            future.cancel()
+
+def iter_pdf_pages(
+    path: str,
+    max_pages: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    normalize: bool = True,
+) -> Iterator[str]:
+    """Yield the text of each page of a PDF in order.
+
+    Args:
+        path (str): Path of the pdf file.
+        max_pages (int, optional): Stop after this many pages.
+        max_chars (int, optional): Stop once the yielded pages reach this many characters.
+        normalize (bool): Collapse blank-line runs in each page.
+
+    Yields:
+        str: Page text, one page at a time. Files with more than
+        PDF_PARALLEL_MIN_PAGES pages are extracted across a process pool.
+    """
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+    if max_pages is not None:
+        page_count = min(page_count, max_pages)
+
+    if page_count > PDF_PARALLEL_MIN_PAGES and PDF_EXTRACT_WORKERS > 1:
+        pages = _iter_parallel(path, page_count)
+    else:
+        pages = (_page_text(reader.pages[number]) for number in range(page_count))
+
+    chars = 0
+    try:
+        for text in pages:
+            if normalize:
+                text = normalize_page(text)
+            yield text
+            chars += len(text)
+            if max_chars is not None and chars >= max_chars:
+                return
+    finally:
+        pages.close()
@@ -0,0 +1,193 @@
+## Process-wide LLM rate limiter shared by all agents, requests and worker processes
+import os
+import json
+import time
+import threading
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are shared by threads of one process only
+    fcntl = None
+
+# Provider quota: requests and tokens per minute (0 disables the limit)
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "15"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "1000000"))
+# Bucket levels live in this file so every uvicorn worker on the host draws from the same quota;
+# absolute so workers started from different directories agree on it
+LLM_LIMITER_STATE = os.path.abspath(os.getenv("LLM_LIMITER_STATE", "llm_limiter.json"))
+# Give up (and fail the LLM call) after queueing this long
+LLM_MAX_WAIT_SECONDS = float(os.getenv("LLM_MAX_WAIT_SECONDS", "300"))
+
+class RateLimitTimeout(Exception):
+    """Raised when an LLM call waited longer than LLM_MAX_WAIT_SECONDS for quota"""
+
+class RateLimitCancelled(Exception):
+    """Raised when the run an LLM call belongs to was stopped while it queued for quota"""
+
+def estimate_tokens(messages) -> int:
+    """Rough token count of a prompt or completion (about four characters per token)"""
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    return sum(len(str(message.get("content") or "")) for message in messages) // 4 + 1
+
+class TokenBucketLimiter:
+    """Two token buckets (requests/min and tokens/min) persisted in a locked state file.
+
+    Callers in one process are served strictly first-come first-served; across
+    processes the buckets are shared through the state file, so the combined
+    rate of all workers stays within the quota.
+    """
+
+    def __init__(
+        self,
+        rpm: int = LLM_RPM_LIMIT,
+        tpm: int = LLM_TPM_LIMIT,
+        state_path: Optional[str] = LLM_LIMITER_STATE,
+        max_wait: float = LLM_MAX_WAIT_SECONDS,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state_path = state_path if fcntl is not None else None
+        self.max_wait = max_wait
+        # FIFO ticket queue for callers in this process
+        self._turn = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._waiting = 0
+        # In-memory buckets when no state file is used
+        self._memory_state = None
+        self._memory_lock = threading.Lock()
+        # Counters
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+        self.last_wait = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    def acquire(self, tokens: int, cancel_event: Optional[threading.Event] = None) -> float:
+        """Block until one request and `tokens` tokens are available; return the seconds waited.
+
+        Once cancel_event is set the call leaves the queue without taking any quota.
+        """
+        if not self.enabled:
+            return 0.0
+        if self.tpm > 0:
+            tokens = min(tokens, self.tpm)  # An oversized prompt must not wait forever
+        start = time.monotonic()
+
+        with self._turn:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._waiting += 1
+            while ticket != self._serving:
+                self._turn.wait()
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RateLimitCancelled("LLM call cancelled while waiting for quota")
+                delay = self._update(lambda state: self._take(state, tokens))
+                if delay <= 0:
+                    break
+                if time.monotonic() - start + delay > self.max_wait:
+                    self.timeouts += 1
+                    raise RateLimitTimeout(f"LLM quota not available within {self.max_wait:.0f}s")
+                if cancel_event is not None:
+                    cancel_event.wait(min(delay, 1.0))
+                else:
+                    time.sleep(min(delay, 1.0))
+        finally:
+            with self._turn:
+                self._serving += 1
+                self._waiting -= 1
+                self._turn.notify_all()
+
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait_seen = max(self.max_wait_seen, waited)
+        self.last_wait = waited
+        return waited
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket once the real size of a call is known"""
+        if self.tpm <= 0 or estimated == actual:
+            return
+
+        def adjust(state):
+            # May go negative: an underestimated call delays the next ones
+            state["tokens"] = min(float(self.tpm), state["tokens"] + estimated - actual)
+        self._update(adjust)
+
+    def snapshot(self) -> dict:
+        """Current bucket levels, queue depth and wait statistics"""
+        state = self._update(lambda state: dict(state)) if self.enabled else {}
+        return {
+            "enabled": self.enabled,
+            "rpm_limit": self.rpm,
+            "tpm_limit": self.tpm,
+            "requests_available": round(state.get("requests", 0.0), 2),
+            "tokens_available": round(state.get("tokens", 0.0)),
+            "waiting": self._waiting,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "total_wait_seconds": round(self.total_wait, 3),
+            "avg_wait_seconds": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+            "max_wait_seconds": round(self.max_wait_seen, 3),
+            "last_wait_seconds": round(self.last_wait, 3),
+            "shared_state": self.state_path,
+        }
+
+    def _take(self, state: dict, tokens: int) -> float:
+        """Deduct one request and `tokens` if available, else return seconds until they are"""
+        delay = 0.0
+        if self.rpm > 0 and state["requests"] < 1:
+            delay = (1 - state["requests"]) * 60.0 / self.rpm
+        if self.tpm > 0 and state["tokens"] < tokens:
+            delay = max(delay, (tokens - state["tokens"]) * 60.0 / self.tpm)
+        if delay > 0:
+            return delay
+        state["requests"] -= 1
+        state["tokens"] -= tokens
+        return 0.0
+
+    def _refill(self, state: Optional[dict]) -> dict:
+        now = time.time()
+        if not state:
+            return {"requests": float(self.rpm), "tokens": float(self.tpm), "updated": now}
+        elapsed = max(0.0, now - state["updated"])
+        state["requests"] = min(float(self.rpm), state["requests"] + elapsed * self.rpm / 60.0)
+        state["tokens"] = min(float(self.tpm), state["tokens"] + elapsed * self.tpm / 60.0)
+        state["updated"] = now
+        return state
+
+    def _update(self, fn):
+        """Apply fn to the refilled bucket state under the cross-process lock and save it"""
+        if self.state_path is None:
+            with self._memory_lock:
+                self._memory_state = self._refill(self._memory_state)
+                return fn(self._memory_state)
+
+        with open(self.state_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path) as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = None
+                state = self._refill(state)
+                result = fn(state)
+                tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.state_path)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+llm_limiter = TokenBucketLimiter()
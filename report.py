@@ -0,0 +1,90 @@
+## Full-report mode: the verification, investment and risk tasks run concurrently on one document
+import os
+import asyncio
+import functools
+import logging
+from typing import Dict, Optional
+
+from crew_pool import CrewPool
+from telemetry import StageTimings
+
+logger = logging.getLogger(__name__)
+
+# Longest any one report section may run; a section past it is reported as timed out
+REPORT_TASK_TIMEOUT_SECONDS = float(os.getenv("REPORT_TASK_TIMEOUT_SECONDS", "300"))
+
+# Section -> (task in task.py, its agent in agents.py, heading in the merged analysis)
+REPORT_SECTIONS = {
+    "verification": ("verification", "verifier", "Document Verification"),
+    "investment": ("investment_analysis", "investment_advisor", "Investment Analysis"),
+    "risk": ("risk_assessment", "risk_assessor", "Risk Assessment"),
+}
+
+def build_section_template(section: str):
+    """Single-agent, single-task crew for one report section (copied by its pool, never run)"""
+    from crewai import Crew, Process
+    import agents
+    import task
+
+    task_name, agent_name, _ = REPORT_SECTIONS[section]
+    return Crew(
+        agents=[getattr(agents, agent_name)],
+        tasks=[getattr(task, task_name)],
+        process=Process.sequential,
+    )
+
+# One pool per section, so the sections of a report never wait on each other for a crew
+section_pools = {
+    section: CrewPool(functools.partial(build_section_template, section))
+    for section in REPORT_SECTIONS
+}
+
+async def run_section(section: str, inputs: dict, timings: StageTimings, progress=None,
+                      bypass_llm_cache: bool = False) -> dict:
+    """Run one section's crew under the per-task timeout; failures are reported, never raised"""
+    with timings.stage(f"crew_{section}"):
+        try:
+            result = await asyncio.wait_for(
+                section_pools[section].kickoff(inputs, progress=progress, bypass_llm_cache=bypass_llm_cache),
+                REPORT_TASK_TIMEOUT_SECONDS
+            )
+            entry = {"status": "success", "output": str(result)}
+        except asyncio.TimeoutError:
+            entry = {"status": "timeout", "detail": f"No result within {REPORT_TASK_TIMEOUT_SECONDS:g} seconds."}
+        except Exception as e:
+            logger.exception("Report section %s failed", section)
+            entry = {"status": "error", "detail": str(e)}
+    entry["seconds"] = timings.stages[f"crew_{section}"]
+    if progress is not None:
+        progress.emit("section", {"section": section, "status": entry["status"], "seconds": entry["seconds"]})
+    return entry
+
+async def run_full_report(query: str, file_path: str, timings: Optional[StageTimings] = None,
+                          progress=None, bypass_llm_cache: bool = False) -> Dict[str, dict]:
+    """Run every report section at once against the same (already parsed) document.
+
+    Wall time is that of the slowest section. Returns {section: {status, output
+    or detail, seconds}} in REPORT_SECTIONS order.
+    """
+    timings = timings or StageTimings()
+    inputs = {"query": query, "file_path": file_path}
+    entries = await asyncio.gather(*(
+        run_section(section, inputs, timings, progress, bypass_llm_cache) for section in REPORT_SECTIONS
+    ))
+    return dict(zip(REPORT_SECTIONS, entries))
+
+def report_status(report: Dict[str, dict]) -> str:
+    """success if every section finished, partial if some did, error if none did"""
+    succeeded = sum(entry["status"] == "success" for entry in report.values())
+    if succeeded == len(report):
+        return "success"
+    return "partial" if succeeded else "error"
+
+def merge_report(report: Dict[str, dict]) -> str:
+    """The sections as one Markdown analysis, in REPORT_SECTIONS order"""
+    parts = []
+    for section, entry in report.items():
+        heading = REPORT_SECTIONS[section][2]
+        body = entry["output"] if entry["status"] == "success" else f"_Unavailable ({entry['status']}): {entry['detail']}_"
+        parts.append(f"## {heading}\n\n{body.strip()}")
+    return "\n\n".join(parts)
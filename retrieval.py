@@ -0,0 +1,191 @@
+## Section-aware chunking and BM25 retrieval over parsed documents
+import os
+import re
+import math
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+# Target size of a chunk; statement tables may run to twice this to stay in one piece
+CHUNK_TARGET_CHARS = int(os.getenv("CHUNK_TARGET_CHARS", "1000"))
+# Chunks returned by a search when the caller does not ask for a number
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+# Number of per-document indexes kept in memory
+RETRIEVAL_INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "64"))
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Heading terms count this many times in a chunk, so section names rank strongly
+HEADING_WEIGHT = 2
+
+_SECTION_HEADING = re.compile(
+    r"^(?:item\s+\d+[a-z]?\b|part\s+[ivx]+\b|note\s+\d+\b"
+    r"|(?:condensed\s+)?consolidated\s+(?:statements?|balance\s+sheets?)"
+    r"|(?:statements?\s+of\s+(?:operations|income|earnings|cash\s+flows?|financial\s+position|comprehensive\s+income|(?:stock|share)holders'?\s+equity))"
+    r"|balance\s+sheets?|income\s+statements?|cash\s+flow\s+statements?"
+    r"|management'?s\s+discussion|risk\s+factors|executive\s+summary|outlook|guidance|highlights)",
+    re.IGNORECASE,
+)
+_NUMBER = re.compile(r"\(?-?\$?\d[\d,]*(?:\.\d+)?%?\)?")
+_TOKEN = re.compile(r"[a-z][a-z0-9']*|\d+(?:\.\d+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were "
+    "what which with will how does do about into than over under".split()
+)
+
+@dataclass(frozen=True)
+class Chunk:
+    """A passage of a document and the section it belongs to"""
+    index: int
+    page: int  # 1-based page the chunk starts on
+    heading: str
+    text: str
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms with stopwords removed and plurals folded (revenues -> revenue)"""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if token.endswith("'s"):
+            token = token[:-2]
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+def _is_numeric_row(line: str) -> bool:
+    return len(_NUMBER.findall(line)) >= 2
+
+def is_heading(line: str) -> bool:
+    """Heuristic for section and statement titles in extracted PDF text"""
+    if not line or len(line) > 80 or line.endswith((".", ",", ";")):
+        return False
+    if _SECTION_HEADING.match(line):
+        return True
+    if any(len(number.strip("()$%-,.")) >= 3 for number in _NUMBER.findall(line)):
+        return False  # Table rows ("Total revenues 96,773 81,462") are not headings
+    words = re.findall(r"[A-Za-z][A-Za-z'&-]*", line)
+    if not words or len(words) > 10:
+        return False
+    if line.isupper() and sum(len(word) for word in words) >= 4:
+        return True
+    significant = [word for word in words if len(word) > 3]
+    return len(words) >= 2 and bool(significant) and all(word[0].isupper() for word in significant)
+
+def chunk_pages(pages: Sequence[str], target_chars: int = CHUNK_TARGET_CHARS) -> List[Chunk]:
+    """Split page texts into chunks that never cross a section heading.
+
+    A chunk is closed at the next heading or once it reaches target_chars;
+    runs of table rows are kept together up to twice that size.
+    """
+    chunks: List[Chunk] = []
+    heading = ""
+    lines: List[str] = []
+    size = 0
+    start_page = 1
+
+    def flush():
+        nonlocal lines, size
+        if lines:
+            chunks.append(Chunk(index=len(chunks), page=start_page, heading=heading, text="\n".join(lines)))
+        lines, size = [], 0
+
+    for page_number, page in enumerate(pages, start=1):
+        for raw in page.splitlines():
+            line = raw.strip()
+            if not line:
+                continue
+            if is_heading(line):
+                flush()
+                heading = line
+                start_page = page_number
+                continue
+            if size >= target_chars and not (_is_numeric_row(line) and size < 2 * target_chars):
+                flush()
+            if not lines:
+                start_page = page_number
+            lines.append(line)
+            size += len(line) + 1
+    flush()
+    return chunks
+
+class ChunkIndex:
+    """BM25 index over the chunks of one document"""
+
+    def __init__(self, chunks: List[Chunk]):
+        self.chunks = chunks
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        for chunk in chunks:
+            terms = Counter(tokenize(chunk.text))
+            for term in tokenize(chunk.heading):
+                terms[term] += HEADING_WEIGHT
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, []).append((chunk.index, frequency))
+            self._lengths.append(sum(terms.values()))
+        count = len(chunks)
+        self._avg_length = (sum(self._lengths) / count) if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    @classmethod
+    def from_pages(cls, pages: Sequence[str]) -> "ChunkIndex":
+        return cls(chunk_pages(pages))
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K) -> List[Tuple[float, Chunk]]:
+        """Top-k (score, chunk) pairs for query, best first; empty if no term matches"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self._postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[index] / self._avg_length)
+                scores[index] = scores.get(index, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(score, self.chunks[index]) for index, score in best]
+
+    def overview(self, top_k: int = RETRIEVAL_TOP_K) -> List[Chunk]:
+        """Opening chunk of each of the first top_k sections, for queries that match nothing"""
+        seen = set()
+        chunks = []
+        for chunk in self.chunks:
+            if chunk.heading not in seen:
+                seen.add(chunk.heading)
+                chunks.append(chunk)
+                if len(chunks) == top_k:
+                    break
+        return chunks
+
+class ChunkIndexCache:
+    """Per-document indexes keyed by content digest, built once and reused by every search"""
+
+    def __init__(self, max_entries: int = RETRIEVAL_INDEX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ChunkIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str, pages: Sequence[str]) -> ChunkIndex:
+        with self._lock:
+            index = self._entries.get(digest)
+            if index is not None:
+                self._entries.move_to_end(digest)
+                return index
+        index = ChunkIndex.from_pages(pages)
+        with self._lock:
+            self._entries[digest] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
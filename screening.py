@@ -0,0 +1,410 @@
+## Cross-document screening: the stored metrics of every analyzed filing as memory-mapped columns
+import os
+import ast
+import glob
+import json
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+
+from db import SessionLocal
+from models import FinancialMetrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized between threads of one process only
+    fcntl = None
+
+# Column files of the screening store, shared by every worker on the host
+SCREEN_STORE_DIR = os.path.abspath(os.getenv("SCREEN_STORE_DIR", "screening"))
+# Longest filter or rank expression accepted
+SCREEN_MAX_EXPRESSION = int(os.getenv("SCREEN_MAX_EXPRESSION", "500"))
+
+# financial_metrics columns a screen can filter and rank on: floats, NaN where a figure is missing
+NUMERIC_COLUMNS = (
+    "revenue", "net_income", "margin_pct", "growth_pct", "cash_flow", "eps",
+    "total_debt", "debt_to_equity", "leverage", "decline_pct", "current_ratio",
+)
+# risk_level is stored as its position here plus one (0: unknown), so levels compare in order
+RISK_LEVELS = ("Low", "Medium", "High")
+# Column -> dtype of its file; row_id is financial_metrics.id, file_id a UUID
+COLUMN_DTYPES = {
+    "row_id": np.dtype("<i8"),
+    "file_id": np.dtype("S36"),
+    "risk_level": np.dtype("i1"),
+    **{column: np.dtype("<f8") for column in NUMERIC_COLUMNS},
+}
+# Bumped when the file layout changes; a store of another version is rebuilt
+_STORE_VERSION = 3
+# Rows read from the database per batch while appending
+_FETCH_BATCH = 10000
+# Ids per query when fetching rows that became visible out of id order
+_GAP_BATCH = 500
+
+class ScreenExpressionError(ValueError):
+    """A filter or rank expression that cannot be evaluated"""
+
+## Expressions: a small, safe subset of Python evaluated on whole columns at once
+_COMPARISONS = {
+    ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less,
+    ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_FUNCTIONS = {"abs": (np.abs, 1), "min": (np.fmin, 2), "max": (np.fmax, 2), "missing": (np.isnan, 1)}
+
+@lru_cache(maxsize=256)
+def parse_expression(expression: str) -> ast.expr:
+    """Syntax tree of an expression, checked to use only columns, numbers and the allowed operators.
+
+    Allowed: column names, numbers, risk level names in quotes, + - * /,
+    comparisons (chained too), and / or / not, parentheses and the functions
+    abs(x), min(x, y), max(x, y) (ignoring missing values) and missing(x).
+    """
+    if len(expression) > SCREEN_MAX_EXPRESSION:
+        raise ScreenExpressionError(f"Expression longer than {SCREEN_MAX_EXPRESSION} characters.")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval").body
+    except SyntaxError as e:
+        raise ScreenExpressionError(f"Invalid expression: {e.msg}.")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id not in NUMERIC_COLUMNS and node.id != "risk_level" and node.id not in _FUNCTIONS:
+                raise ScreenExpressionError(
+                    f"Unknown column '{node.id}'. Columns: {', '.join(NUMERIC_COLUMNS + ('risk_level',))}."
+                )
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS or node.keywords:
+                raise ScreenExpressionError(f"Functions: {', '.join(_FUNCTIONS)}.")
+            if len(node.args) != _FUNCTIONS[node.func.id][1]:
+                raise ScreenExpressionError(f"{node.func.id}() takes {_FUNCTIONS[node.func.id][1]} argument(s).")
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float, str)):
+                raise ScreenExpressionError(f"Unsupported value {node.value!r}.")
+            if isinstance(node.value, str) and node.value.title() not in RISK_LEVELS:
+                raise ScreenExpressionError(f"Text values must be a risk level: {', '.join(RISK_LEVELS)}.")
+        elif not isinstance(node, (
+            ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd, ast.BinOp,
+            ast.Compare, ast.Load, *_COMPARISONS, *_ARITHMETIC,
+        )):
+            raise ScreenExpressionError(f"Unsupported syntax: {type(node).__name__}.")
+    return tree
+
+def evaluate(node: ast.expr, columns: Dict[str, np.ndarray]):
+    """Value of a parsed expression for every row: a float or bool array (or a scalar for constants)"""
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, str):
+            return float(RISK_LEVELS.index(node.value.title()) + 1)
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        if node.id not in columns:
+            raise ScreenExpressionError(f"{node.id} is a function; call it, e.g. {node.id}(revenue).")
+        return columns[node.id]
+    if isinstance(node, ast.BoolOp):
+        values = [_boolean(evaluate(value, columns)) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        result = values[0]
+        for value in values[1:]:
+            result = combine(result, value)
+        return result
+    if isinstance(node, ast.UnaryOp):
+        operand = evaluate(node.operand, columns)
+        if isinstance(node.op, ast.Not):
+            return np.logical_not(_boolean(operand))
+        return np.negative(_numeric(operand)) if isinstance(node.op, ast.USub) else _numeric(operand)
+    if isinstance(node, ast.BinOp):
+        return _ARITHMETIC[type(node.op)](_numeric(evaluate(node.left, columns)),
+                                          _numeric(evaluate(node.right, columns)))
+    if isinstance(node, ast.Compare):
+        # a < b < c is (a < b) and (b < c); comparisons with a missing value are false
+        left = _numeric(evaluate(node.left, columns))
+        result = None
+        for op, right_node in zip(node.ops, node.comparators):
+            right = _numeric(evaluate(right_node, columns))
+            compared = _COMPARISONS[type(op)](left, right)
+            result = compared if result is None else np.logical_and(result, compared)
+            left = right
+        return result
+    function, _ = _FUNCTIONS[node.func.id]
+    return function(*(_numeric(evaluate(arg, columns)) for arg in node.args))
+
+def _numeric(value):
+    if isinstance(value, np.ndarray) and value.dtype == bool:
+        raise ScreenExpressionError("A condition was used where a number is expected.")
+    return value
+
+def _boolean(value):
+    if not isinstance(value, np.ndarray) or value.dtype != bool:
+        raise ScreenExpressionError("A number was used where a condition is expected.")
+    return value
+
+class ScreeningStore:
+    """Metrics of every analyzed document, one memory-mapped file per column.
+
+    financial_metrics stays the source of truth. Its rows are only ever
+    inserted, so the store follows it by appending the rows past the last id
+    it holds; any worker can append, under a file lock. meta.json records how
+    many rows are complete, so a crash mid-append is cut off on the next refresh.
+
+    Each refresh compares the database's MAX(id) and COUNT(*) with the store.
+    Rows that committed out of id order (concurrent writers on Postgres) are
+    found by the count and appended late. A store that no longer matches the
+    database (its last row is gone or is another document, e.g. after the
+    database was recreated) is rebuilt.
+
+    Other threads and workers may still be reading the files through their
+    maps, and a map of a file truncated below its length faults (SIGBUS). So
+    a file is never cut below the row count meta.json has published: a rebuild
+    writes a new generation of files, switches meta.json to it and then
+    unlinks the old one (open maps of unlinked files stay valid).
+    """
+
+    def __init__(self, directory: str = SCREEN_STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # (row count, highest financial_metrics id, column -> array); replaced whole on refresh
+        self._snapshot = (0, 0, self._open(0, 0))
+        # Counters (this process)
+        self.appended = 0
+        self.screens = 0
+
+    def _path(self, name: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{name}.{generation}.bin")
+
+    def _open(self, count: int, generation: int) -> Dict[str, np.ndarray]:
+        """Read-only maps of the first count rows of every column"""
+        if count == 0:
+            return {name: np.empty(0, dtype) for name, dtype in COLUMN_DTYPES.items()}
+        return {
+            name: np.memmap(self._path(name, generation), dtype=dtype, mode="r", shape=(count,))
+            for name, dtype in COLUMN_DTYPES.items()
+        }
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return _empty_meta()
+        if meta.get("version") != _STORE_VERSION:
+            return _empty_meta()
+        return meta
+
+    def _write_meta(self, meta: dict) -> None:
+        path = os.path.join(self.directory, "meta.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def refresh(self) -> None:
+        """Catch up with financial_metrics; cheap (one MAX and COUNT query) when nothing is new"""
+        db = SessionLocal()
+        try:
+            # Two queries: SQLite answers each from an index, but not both in one
+            newest = db.query(func.max(FinancialMetrics.id)).scalar() or 0
+            total = db.query(func.count()).select_from(FinancialMetrics).scalar()
+        finally:
+            db.close()
+        if self._snapshot[:2] == (total, newest):
+            return
+        with self._lock:
+            if self._snapshot[:2] == (total, newest):
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, "meta.lock"), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    meta = self._sync(self._read_meta(), newest, total)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._snapshot = (meta["count"], meta["last_id"], self._open(meta["count"], meta["generation"]))
+
+    def _sync(self, meta: dict, newest: int, total: int) -> dict:
+        """Bring the store to the database's state at (MAX(id), COUNT(*)) (caller holds the file lock)"""
+        db = SessionLocal()
+        try:
+            if meta["count"]:
+                last_file_id = db.query(FinancialMetrics.file_id).filter(
+                    FinancialMetrics.id == meta["last_id"]
+                ).scalar()
+                if last_file_id != meta.get("last_file_id"):
+                    meta = _empty_meta(meta["generation"] + 1)  # Not the database the store was built from
+            meta = self._append(db, meta)
+            held = self._open(meta["count"], meta["generation"])["row_id"]
+            held_ids = held[held <= newest]
+            if len(held_ids) > total:
+                # Rows were deleted: rebuild
+                meta = self._append(db, _empty_meta(meta["generation"] + 1))
+            elif len(held_ids) < total:
+                # Rows that became visible after higher ids were already stored
+                visible = np.array(
+                    [row_id for (row_id,) in db.query(FinancialMetrics.id).filter(FinancialMetrics.id <= newest)],
+                    dtype=COLUMN_DTYPES["row_id"],
+                )
+                missing = np.setdiff1d(visible, held_ids, assume_unique=True).tolist()
+                for start in range(0, len(missing), _GAP_BATCH):
+                    meta = self._append(db, meta, missing[start:start + _GAP_BATCH])
+        finally:
+            db.close()
+        # Publish the generation (also when a rebuild found no rows) before unlinking the previous one
+        self._write_meta(meta)
+        self._remove_other_generations(meta["generation"])
+        return meta
+
+    def _remove_other_generations(self, generation: int) -> None:
+        """Unlink column files of earlier generations (and earlier store versions)"""
+        current = {os.path.basename(self._path(name, generation)) for name in COLUMN_DTYPES}
+        for path in glob.glob(os.path.join(self.directory, "*.bin")):
+            if os.path.basename(path) not in current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Still open on Windows; removed after a later rebuild
+
+    def _append(self, db, meta: dict, ids: Optional[List[int]] = None) -> dict:
+        """Append the financial_metrics rows past meta's last id, or the rows with the given ids"""
+        count = meta["count"]
+        files = {}
+        try:
+            for name, dtype in COLUMN_DTYPES.items():
+                f = open(self._path(name, meta["generation"]), "ab")
+                # Drop rows written by an append that never reached meta.json (no map covers them)
+                f.truncate(count * dtype.itemsize)
+                files[name] = f
+            fields = [getattr(FinancialMetrics, name) for name in ("id", "file_id", "risk_level") + NUMERIC_COLUMNS]
+            while True:
+                if ids is None:
+                    rows = (
+                        db.query(*fields)
+                        .filter(FinancialMetrics.id > meta["last_id"])
+                        .order_by(FinancialMetrics.id)
+                        .limit(_FETCH_BATCH)
+                        .all()
+                    )
+                else:
+                    rows = db.query(*fields).filter(FinancialMetrics.id.in_(ids)).order_by(FinancialMetrics.id).all()
+                    ids = []
+                if not rows:
+                    break
+                batch = list(zip(*rows))
+                columns = {
+                    "row_id": np.array(batch[0], dtype=COLUMN_DTYPES["row_id"]),
+                    "file_id": np.array([file_id.encode("ascii") for file_id in batch[1]],
+                                        dtype=COLUMN_DTYPES["file_id"]),
+                    "risk_level": np.array([_risk_code(level) for level in batch[2]],
+                                           dtype=COLUMN_DTYPES["risk_level"]),
+                }
+                for index, name in enumerate(NUMERIC_COLUMNS, start=3):
+                    # None becomes NaN
+                    columns[name] = np.array(batch[index], dtype=COLUMN_DTYPES[name])
+                for name, f in files.items():
+                    f.write(columns[name].tobytes())
+                count += len(rows)
+                self.appended += len(rows)
+                meta = {**meta, "count": count}
+                if batch[0][-1] > meta["last_id"]:
+                    meta.update(last_id=int(batch[0][-1]), last_file_id=batch[1][-1])
+                for f in files.values():
+                    f.flush()
+                self._write_meta(meta)
+        finally:
+            for f in files.values():
+                f.close()
+        return meta
+
+    def screen(self, filter_expression: Optional[str] = None, rank_expression: Optional[str] = None,
+               descending: bool = True, limit: int = 50) -> dict:
+        """Documents matching filter, ordered by rank (missing scores last) or newest first.
+
+        Both expressions are evaluated over the whole corpus at once; only the
+        returned rows are looked up in the database (for their file names).
+        """
+        filter_tree = parse_expression(filter_expression) if filter_expression else None
+        rank_tree = parse_expression(rank_expression) if rank_expression else None
+        self.refresh()
+        count, _, stored = self._snapshot
+        self.screens += 1
+
+        columns = dict(stored)
+        risk = stored["risk_level"].astype(np.float64)
+        risk[risk == 0] = np.nan
+        columns["risk_level"] = risk
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if filter_tree is not None:
+                mask = evaluate(filter_tree, columns)
+                if not isinstance(mask, np.ndarray) or mask.dtype != bool:
+                    raise ScreenExpressionError("The filter must be a condition, e.g. debt_to_equity > 2.")
+                matched = np.flatnonzero(mask)
+            else:
+                matched = np.arange(count)
+            scores = None
+            if rank_tree is not None:
+                scores = np.broadcast_to(_numeric(evaluate(rank_tree, columns)), (count,)).astype(np.float64)
+
+        if scores is not None:
+            key = -scores[matched] if descending else scores[matched].copy()
+            key[~np.isfinite(key)] = np.inf
+            if len(matched) > limit:
+                top = np.argpartition(key, limit - 1)[:limit]
+                top = top[np.argsort(key[top], kind="stable")]
+            else:
+                top = np.argsort(key, kind="stable")
+            selected = matched[top]
+        else:
+            selected = matched[::-1][:limit]
+
+        names = self._file_names(stored["row_id"][selected].tolist())
+        items = []
+        for index in selected.tolist():
+            row_id = int(stored["row_id"][index])
+            item = {
+                "file_id": stored["file_id"][index].decode("ascii"),
+                "file_processed": names.get(row_id),
+                "risk_level": RISK_LEVELS[stored["risk_level"][index] - 1] if stored["risk_level"][index] else None,
+            }
+            for name in NUMERIC_COLUMNS:
+                item[name] = _optional(stored[name][index])
+            if scores is not None:
+                item["score"] = _optional(scores[index])
+            items.append(item)
+        return {"documents": count, "matched": int(len(matched)), "items": items}
+
+    def _file_names(self, row_ids: List[int]) -> Dict[int, Optional[str]]:
+        if not row_ids:
+            return {}
+        db = SessionLocal()
+        try:
+            rows = db.query(FinancialMetrics.id, FinancialMetrics.file_processed).filter(
+                FinancialMetrics.id.in_(row_ids)
+            ).all()
+        finally:
+            db.close()
+        return dict(rows)
+
+    def stats(self) -> dict:
+        count, last_id, _ = self._snapshot
+        return {
+            "documents": count,
+            "last_id": last_id,
+            "bytes": count * sum(dtype.itemsize for dtype in COLUMN_DTYPES.values()),
+            "directory": self.directory,
+            "appended": self.appended,
+            "screens": self.screens,
+        }
+
+def _empty_meta(generation: int = 0) -> dict:
+    return {"version": _STORE_VERSION, "generation": generation, "count": 0, "last_id": 0, "last_file_id": None}
+
+def _risk_code(level: Optional[str]) -> int:
+    return RISK_LEVELS.index(level.title()) + 1 if level and level.title() in RISK_LEVELS else 0
+
+def _optional(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+screening_store = ScreeningStore()
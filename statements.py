@@ -0,0 +1,236 @@
+## Multi-period financial statement tables as NumPy arrays, with ratios computed across all periods
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# A reporting period in a column header: 2023, FY2023, Q2 2025, H1 2024
+_PERIOD = re.compile(r"\b(?:(Q[1-4]|H[12])\s*)?(?:FY\s*)?((?:19|20)\d{2})\b", re.IGNORECASE)
+# Amount cell: 1,234.5, (1,234) for negatives, or a dash for zero; percentages are not amounts
+_AMOUNT = re.compile(r"\(?-?\d[\d,]*(?:\.\d+)?\)?%?|(?<!\S)[—–-](?!\S)")
+_UNITS = re.compile(r"\bin\s+(thousands|millions|billions)\b", re.IGNORECASE)
+_UNIT_SCALES = {"thousands": 1e3, "millions": 1e6, "billions": 1e9}
+# A footnote marker after a row label, e.g. "Net income (1)": not an amount
+_FOOTNOTE = re.compile(r"\(\d\)")
+# The only words a period header may contain besides the periods: dates, fiscal terms and units
+_HEADER_WORDS = frozenset("""
+    january february march april may june july august september october november december
+    jan feb mar apr jun jul aug sep sept oct nov dec
+    year years quarter quarters month months week weeks three six nine twelve fifty two
+    fiscal fy period ended ending end as of at and the for
+    in thousands millions billions except per share amounts data dollars usd
+""".split())
+
+# Line item -> pattern for the row label (lowercased, without the amounts)
+LINE_ITEMS = {
+    "revenue": r"(?:total\s+)?(?:net\s+)?(?:revenues?|sales|net\s+sales)",
+    "cost_of_revenue": r"(?:total\s+)?cost\s+of\s+(?:revenues?|sales|goods\s+sold)",
+    "gross_profit": r"gross\s+(?:profit|margin)",
+    "operating_income": r"(?:operating\s+(?:income|profit|loss)|(?:income|profit|loss)\s+(?:\(loss\)\s+)?from\s+operations)(?:\s+\(loss\))?",
+    "net_income": r"net\s+(?:income|earnings|profit|loss)\b(?!.*per\s+share).*",
+    "current_assets": r"total\s+current\s+assets",
+    "current_liabilities": r"total\s+current\s+liabilities",
+    "total_assets": r"total\s+assets",
+    "total_liabilities": r"total\s+liabilities",
+    "total_equity": r"total\s+(?:(?:stockholders|shareholders)'?\s+)?equity",
+    "total_debt": r"total\s+debt",
+    "long_term_debt": r"long-term\s+debt(?:\s+and\s+finance\s+leases)?(?:,\s+net(?:\s+of\s+current\s+portion)?)?",
+    "short_term_debt": r"(?:short-term\s+(?:debt|borrowings)|current\s+portion\s+of\s+long-term\s+debt)",
+    "operating_cash_flow": r"net\s+cash\s+(?:provided\s+by|from|\(used\s+in\)\s+provided\s+by|provided\s+by\s+\(used\s+in\))\s+operating\s+activities",
+    "capital_expenditures": r"(?:capital\s+expenditures|purchases\s+of\s+property(?:,)?\s+(?:plant\s+)?and\s+equipment)",
+}
+_LINE_ITEM = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in LINE_ITEMS.items()))
+
+@dataclass
+class FinancialStatements:
+    """Statement line items as float arrays aligned on periods (latest first), NaN where absent.
+
+    Amounts are in units: a table stated "in millions" is scaled by 1e6.
+    """
+    periods: List[str]
+    items: Dict[str, np.ndarray]
+    _ratios: Optional[Dict[str, np.ndarray]] = field(default=None, repr=False)
+
+    def item(self, name: str) -> np.ndarray:
+        values = self.items.get(name)
+        return values if values is not None else np.full(len(self.periods), np.nan)
+
+    def ratios(self) -> Dict[str, np.ndarray]:
+        """Margins (%), YoY growth (%), liquidity and leverage ratios for every period at once"""
+        if self._ratios is None:
+            revenue = self.item("revenue")
+            gross = self.item("gross_profit")
+            gross = np.where(np.isnan(gross), revenue - self.item("cost_of_revenue"), gross)
+            long_term, short_term = self.item("long_term_debt"), self.item("short_term_debt")
+            # Long- plus short-term debt where no total is reported (unknown if neither is)
+            summed = np.where(np.isnan(long_term) & np.isnan(short_term), np.nan,
+                              np.nan_to_num(long_term) + np.nan_to_num(short_term))
+            debt = self.item("total_debt")
+            debt = np.where(np.isnan(debt), summed, debt)
+            growth = np.full(len(self.periods), np.nan)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                growth[:-1] = (revenue[:-1] / revenue[1:] - 1) * 100
+                ratios = {
+                    "gross_margin_pct": gross / revenue * 100,
+                    "operating_margin_pct": self.item("operating_income") / revenue * 100,
+                    "net_margin_pct": self.item("net_income") / revenue * 100,
+                    "revenue_growth_pct": growth,
+                    "current_ratio": self.item("current_assets") / self.item("current_liabilities"),
+                    "debt_to_equity": debt / self.item("total_equity"),
+                    "total_debt": debt,
+                    "free_cash_flow": self.item("operating_cash_flow") - np.abs(self.item("capital_expenditures")),
+                }
+            for values in ratios.values():
+                values[~np.isfinite(values)] = np.nan
+            self._ratios = ratios
+        return self._ratios
+
+    def series(self, name: str) -> np.ndarray:
+        """A line item or a ratio"""
+        return self.items[name] if name in self.items else self.ratios().get(name, self.item(name))
+
+    def latest(self, name: str) -> Optional[Tuple[str, float]]:
+        """(period, value) of the most recent period reporting name, or None"""
+        values = self.series(name)
+        present = np.flatnonzero(~np.isnan(values))
+        if not present.size:
+            return None
+        return self.periods[present[0]], float(values[present[0]])
+
+    def reported(self, name: str) -> List[Tuple[str, float]]:
+        """(period, value) of every period reporting name, latest first"""
+        values = self.series(name)
+        return [(period, float(value)) for period, value in zip(self.periods, values) if not np.isnan(value)]
+
+    def as_dict(self) -> dict:
+        """JSON-friendly periods, line items and ratios (None where absent)"""
+        def listed(values):
+            return [None if np.isnan(value) else round(float(value), 4) for value in values]
+        return {
+            "periods": self.periods,
+            "items": {name: listed(values) for name, values in self.items.items()},
+            "ratios": {name: listed(values) for name, values in self.ratios().items()},
+        }
+
+def _period_label(match: "re.Match") -> str:
+    prefix, year = match.group(1), match.group(2)
+    return f"{prefix.upper()} {year}" if prefix else year
+
+def _period_sort_key(label: str) -> Tuple[int, int]:
+    prefix, _, year = label.rpartition(" ")
+    return int(year), int(prefix[1]) if prefix else 9
+
+def parse_period_header(line: str) -> Optional[List[str]]:
+    """Column periods of a table header such as 'December 31, 2023  2022', else None.
+
+    Prose ("notes mature between 2029 and 2031.") and schedules labelled with
+    other words ("Scheduled maturities of debt 2025 2026") are not headers.
+    """
+    return _header_periods(line, list(_PERIOD.finditer(line)))
+
+def _header_periods(line: str, periods: List["re.Match"]) -> Optional[List[str]]:
+    """parse_period_header given the line's period matches"""
+    if len(periods) < 2 or len(line) > 160 or line.rstrip()[-1] in ".,;:!?":
+        return None
+    rest = _PERIOD.sub(" ", line)
+    if any(word.lower() not in _HEADER_WORDS for word in re.findall(r"[A-Za-z]+", rest)):
+        return None
+    # Only day numbers (December 31) may remain next to the periods
+    for amount in _AMOUNT.findall(rest):
+        digits = amount.strip("(),%")
+        if not digits.isdigit() or int(digits) > 31:
+            return None
+    return [_period_label(match) for match in periods]
+
+def _amount(token: str) -> Optional[float]:
+    if token in ("—", "–", "-"):
+        return 0.0
+    negative = token.startswith("(") or token.startswith("-")
+    try:
+        value = float(token.strip("()-").replace(",", ""))
+    except ValueError:
+        return None
+    return -value if negative else value
+
+def parse_row(line: str, columns: int) -> Optional[Tuple[str, List[float]]]:
+    """(line item, first `columns` amounts) of a table row with a known label, else None"""
+    if _LINE_ITEM.match(line.lower()) is None:
+        return None  # Cheap rejection of most lines: the label must at least start like a line item
+    line = line.replace("$", " ")
+    amounts = [match for match in _AMOUNT.finditer(line) if not match.group().endswith("%")]
+    if len(amounts) < columns:
+        return None
+    label = " ".join(line[:amounts[0].start()].lower().split()).strip(" :.")
+    match = _LINE_ITEM.fullmatch(label)
+    if match is None:
+        return None
+    # Footnote markers right after the label, unless the row needs them as amounts
+    while len(amounts) > columns and _FOOTNOTE.fullmatch(amounts[0].group()):
+        amounts.pop(0)
+    values = [_amount(amount.group()) for amount in amounts[:columns]]
+    if any(value is None for value in values):
+        return None
+    return match.lastgroup, values
+
+def extract_statements(pages: Sequence[str]) -> Optional[FinancialStatements]:
+    """Statement tables of a document, or None if it has no recognizable multi-period rows.
+
+    A table starts at a header naming two or more periods; rows below it whose
+    label is a known line item fill that item's columns. Any other line naming
+    two or more periods ends the table. The first table that reports an item
+    for a period wins (primary statements come before notes), and periods after
+    the latest one of that first table (debt maturities, projections) are dropped.
+
+    A unit note ("in millions") applies to the table it precedes or opens; a
+    table without one is in units.
+    """
+    rows: Dict[str, Dict[str, float]] = {}
+    periods: Optional[List[str]] = None
+    scale = 1.0
+    # Scale of a unit note seen since the last table's first row, for the next header
+    pending_scale: Optional[float] = None
+    # Sort key of the latest period of the first table with rows
+    latest_primary: Optional[Tuple[int, int]] = None
+    for page in pages:
+        for raw in page.splitlines():
+            line = raw.strip()
+            if not line:
+                continue
+            units = _UNITS.search(line)
+            if units:
+                scale = pending_scale = _UNIT_SCALES[units.group(1).lower()]
+            named = list(_PERIOD.finditer(line))
+            header = _header_periods(line, named)
+            if header is not None:
+                periods = header
+                scale = pending_scale or 1.0
+                pending_scale = None
+                continue
+            if periods is None:
+                continue
+            row = parse_row(line, len(periods))
+            if row is None:
+                if len(named) >= 2:
+                    periods = None
+                continue
+            pending_scale = None
+            if latest_primary is None:
+                latest_primary = max(map(_period_sort_key, periods))
+            name, values = row
+            item = rows.setdefault(name, {})
+            for period, value in zip(periods, values):
+                if _period_sort_key(period) <= latest_primary:
+                    item.setdefault(period, value * scale)
+    rows = {name: values for name, values in rows.items() if values}
+    if not rows:
+        return None
+
+    labels = sorted({period for item in rows.values() for period in item}, key=_period_sort_key, reverse=True)
+    column = {label: index for index, label in enumerate(labels)}
+    items = {}
+    for name, values in rows.items():
+        array = np.full(len(labels), np.nan)
+        array[[column[period] for period in values]] = list(values.values())
+        items[name] = array
+    return FinancialStatements(periods=labels, items=items)
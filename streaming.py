@@ -0,0 +1,65 @@
+## Progress events of one analysis, relayed from crew threads to a server-sent-events response
+import json
+import asyncio
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+# Marker after which a ReAct-style completion holds the agent's final answer
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+def sse(event: str, data: dict) -> str:
+    """One server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class ProgressStream:
+    """Thread-safe queue of (event, data) pairs consumed by one SSE response.
+
+    Tools and LLM calls run in crew worker threads; emit() hands their events
+    to the event loop that owns the response.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue: "asyncio.Queue[Optional[Tuple[str, dict]]]" = asyncio.Queue()
+        # Per agent (several run at once in full-report mode): text of the LLM call
+        # in progress until its final answer starts, and agents past that point
+        self._completions: Dict[Optional[str], str] = {}
+        self._answering: Set[Optional[str]] = set()
+
+    def emit(self, event: str, data: dict) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, data))
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    def timing(self, entry: dict) -> None:
+        """Listener for telemetry path timings: tool calls and the PDF parse"""
+        if "tool" in entry:
+            self.emit("tool", entry)
+        else:
+            self.emit("stage", entry)
+
+    def llm_started(self, agent: Optional[str]) -> None:
+        self._completions[agent] = ""
+        self._answering.discard(agent)
+        self.emit("llm_call", {"agent": agent})
+
+    def llm_chunk(self, agent: Optional[str], chunk: str) -> None:
+        """Stream the part of a completion that follows the final-answer marker"""
+        if agent in self._answering:
+            self.emit("answer", {"agent": agent, "text": chunk})
+            return
+        completion = self._completions.get(agent, "") + chunk
+        self._completions[agent] = completion
+        marker = completion.find(FINAL_ANSWER_MARKER)
+        if marker >= 0:
+            self._answering.add(agent)
+            text = completion[marker + len(FINAL_ANSWER_MARKER):].lstrip()
+            if text:
+                self.emit("answer", {"agent": agent, "text": text})
+
+    async def events(self) -> AsyncIterator[Tuple[str, dict]]:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            yield item
@@ -2,12 +2,12 @@
 from crewai import Task
 
 from agents import financial_analyst, verifier, investment_advisor, risk_assessor
-from tools import search_tool, FinancialDocumentTool, InvestmentTool, RiskTool
+from tools import DocumentSearchTool, InvestmentTool, RiskTool
 
 ## Creating a task to help solve user's query
 analyze_financial_document = Task(
     description="Analyze the financial document at path: {file_path} to answer the user's query: {query}.\n\
-Use the Financial Document Reader tool to read the document content.\n\
+Use the Financial Document Search tool with the query (and narrower sub-questions) to read the relevant passages.\n\
 Use the Investment Analysis Tool and Risk Assessment Tool to extract key metrics.\n\
 Provide ONLY your analytical insights and recommendations.\n\
 DO NOT include or repeat any raw document content, tables, or data dumps in your response.\n\
@@ -30,14 +30,14 @@ Write in natural, conversational paragraphs. Do NOT include:
 Keep the response focused, analytical, and professional.""",
 
     agent=financial_analyst,
-    tools=[FinancialDocumentTool(), InvestmentTool(), RiskTool()],
+    tools=[DocumentSearchTool(), InvestmentTool(), RiskTool()],
     async_execution=True,
 )
 
 ## Creating an investment analysis task
 investment_analysis = Task(
     description="Read the financial document at {file_path} and provide investment analysis for query: {query}.\n\
-Use the Financial Document Reader tool to extract actual financial data.\n\
+Use the Financial Document Search tool to retrieve the passages with actual financial data.\n\
 Base all investment recommendations on real metrics from the document.\n\
 Consider factors like P/E ratios, debt-to-equity, revenue growth, and market position.\n\
 Provide conservative and aggressive investment scenarios based on the data.",
@@ -51,14 +51,14 @@ Provide conservative and aggressive investment scenarios based on the data.",
 - All recommendations must cite specific data from the financial document""",
 
     agent=investment_advisor,
-    tools=[FinancialDocumentTool(),InvestmentTool(), RiskTool()],
+    tools=[DocumentSearchTool(),InvestmentTool(), RiskTool()],
     async_execution=True,
 )
 
 ## Creating a risk assessment task
 risk_assessment = Task(
     description="Analyze the financial document at {file_path} to identify real financial risks for query: {query}.\n\
-Use the Financial Document Reader tool to examine actual financial statements.\n\
+Use the Financial Document Search tool to retrieve the relevant financial statements and risk disclosures.\n\
 Focus on liquidity risks, debt levels, market exposure, and operational risks.\n\
 Provide quantitative risk assessment based on document data.\n\
 Consider regulatory compliance and industry-specific risks.",
@@ -72,13 +72,13 @@ Consider regulatory compliance and industry-specific risks.",
 - All risk assessments must be based on actual document content""",
 
     agent=risk_assessor,
-    tools=[FinancialDocumentTool(),InvestmentTool(), RiskTool()],
+    tools=[DocumentSearchTool(),InvestmentTool(), RiskTool()],
     async_execution=True,
 )
 
 verification = Task(
-    description="Verify that the file at {file_path} is a valid financial document using the Financial Document Reader tool.\n\
-Read the document content and confirm it contains financial statements, reports, or relevant financial data.\n\
+    description="Verify that the file at {file_path} is a valid financial document using the Financial Document Search tool.\n\
+Search the document and confirm it contains financial statements, reports, or relevant financial data.\n\
 Validate the document structure and identify the type of financial report.\n\
 Ensure the document has sufficient data for analysis.",
 
@@ -90,6 +90,6 @@ Ensure the document has sufficient data for analysis.",
 - Any limitations or missing information noted""",
 
     agent=verifier,
-    tools=[FinancialDocumentTool(),InvestmentTool(), RiskTool()],
+    tools=[DocumentSearchTool(),InvestmentTool(), RiskTool()],
     async_execution=True,
 )
\ No newline at end of file
@@ -0,0 +1,135 @@
+## Latency instrumentation exported in Prometheus format
+import os
+import time
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest,
+)
+
+# Spans from a few milliseconds (cached tool calls) to minutes (full crew runs)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "analyzer_stage_seconds", "Duration of each /analyze pipeline stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+TOOL_SECONDS = Histogram(
+    "analyzer_tool_seconds", "Duration of tool invocations", ["tool"], buckets=LATENCY_BUCKETS
+)
+LLM_SECONDS = Histogram(
+    "analyzer_llm_call_seconds", "Duration of LLM calls, excluding rate-limit waits", ["agent"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_WAIT_SECONDS = Histogram(
+    "analyzer_llm_ratelimit_wait_seconds", "Time LLM calls queued for quota", buckets=LATENCY_BUCKETS
+)
+LLM_CALLS = Counter("analyzer_llm_calls_total", "LLM calls", ["agent", "outcome"])
+LLM_TOKENS = Counter("analyzer_llm_tokens_total", "Estimated LLM tokens", ["agent", "kind"])
+LLM_CACHE_LOOKUPS = Counter("analyzer_llm_cache_lookups_total", "LLM completion cache lookups", ["outcome"])
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+class StageTimings:
+    """Stage durations of one request, saved with its AnalysisResult"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.tool_calls: List[dict] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            observe_stage(name, elapsed)
+            self.add(name, elapsed)
+
+    def add(self, name: str, seconds: float) -> None:
+        """Record a duration measured elsewhere (already exported) under this request"""
+        self.stages[name] = round(self.stages.get(name, 0.0) + seconds, 6)
+
+    def collect(self, path: str) -> None:
+        """Attach the parse and tool timings recorded for path while the crew ran"""
+        for entry in pop_path_timings(path):
+            if "stage" in entry:
+                self.add(entry["stage"], entry["seconds"])
+            else:
+                self.tool_calls.append(entry)
+
+    def as_dict(self) -> dict:
+        return {"stages": self.stages, "tool_calls": self.tool_calls}
+
+## Timings measured inside the crew (PDF parse, tool calls), keyed by document path
+# so the request that owns the upload can collect them afterwards
+_path_timings: "OrderedDict[str, List[dict]]" = OrderedDict()
+_path_timings_lock = threading.Lock()
+_MAX_TRACKED_PATHS = 1024
+# Callbacks notified of each timing as it is recorded, e.g. to stream progress to a client
+_path_listeners: Dict[str, Callable[[dict], None]] = {}
+
+def _remember(path: str, entry: dict) -> None:
+    with _path_timings_lock:
+        _path_timings.setdefault(path, []).append(entry)
+        while len(_path_timings) > _MAX_TRACKED_PATHS:
+            _path_timings.popitem(last=False)
+        listener = _path_listeners.get(path)
+    if listener is not None:
+        listener(entry)
+
+def listen_path(path: str, listener: Optional[Callable[[dict], None]]) -> None:
+    """Call listener with every stage/tool timing recorded for path (None removes it)"""
+    with _path_timings_lock:
+        if listener is None:
+            _path_listeners.pop(path, None)
+        else:
+            _path_listeners[path] = listener
+
+def record_path_stage(path: str, stage: str, seconds: float) -> None:
+    observe_stage(stage, seconds)
+    _remember(path, {"stage": stage, "seconds": round(seconds, 6)})
+
+def record_tool_call(tool: str, path: str, seconds: float) -> None:
+    TOOL_SECONDS.labels(tool).observe(seconds)
+    _remember(path, {"tool": tool, "seconds": round(seconds, 6)})
+
+def pop_path_timings(path: str) -> List[dict]:
+    with _path_timings_lock:
+        return _path_timings.pop(path, [])
+
+def instrumented_tool(run):
+    """Decorator for a tool's _run(path): exports and records the call duration"""
+    @functools.wraps(run)
+    def wrapper(self, path: str = 'data/sample.pdf', *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return run(self, path, *args, **kwargs)
+        finally:
+            record_tool_call(self.name, path, time.perf_counter() - start)
+    return wrapper
+
+def record_llm_call(agent: Optional[str], seconds: float, wait: float, prompt_tokens: int,
+                    completion_tokens: int, outcome: str) -> None:
+    agent = agent or "unknown"
+    LLM_SECONDS.labels(agent).observe(seconds)
+    LLM_WAIT_SECONDS.observe(wait)
+    LLM_CALLS.labels(agent, outcome).inc()
+    LLM_TOKENS.labels(agent, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(agent, "completion").inc(completion_tokens)
+
+def prometheus_payload() -> bytes:
+    """Exposition text for this process, or for all workers in multiprocess mode"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+PROMETHEUS_CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -0,0 +1,87 @@
+"""Tests for screening expressions (screening.py): what is rejected, and how missing values behave"""
+import numpy as np
+import pytest
+
+from screening import NUMERIC_COLUMNS, SCREEN_MAX_EXPRESSION, ScreenExpressionError, evaluate, parse_expression
+
+def columns(**values):
+    """Three rows; columns not given are all missing"""
+    data = {name: np.full(3, np.nan) for name in NUMERIC_COLUMNS}
+    data.update({name: np.array(column, dtype=float) for name, column in values.items()})
+    data.setdefault("risk_level", np.array([1.0, 3.0, np.nan]))
+    return data
+
+def run(expression, data):
+    return evaluate(parse_expression(expression), data)
+
+@pytest.mark.parametrize("expression", [
+    "revenue.real > 0",                     # attribute
+    "revenue.__class__",                    # dunder attribute
+    "__import__('os')",                     # call of an unknown function
+    "open('x')",
+    "abs(revenue).__class__",
+    "abs(x=revenue)",                       # keyword arguments
+    "min(revenue)",                         # wrong number of arguments
+    "revenue ** 2 > 1",                     # power
+    "revenue % 2 == 0",
+    "revenue in (1, 2)",                    # membership
+    "revenue not in [1]",
+    "revenue > 1 if eps else eps > 1",      # conditional expression
+    "lambda: revenue",
+    "[revenue]",
+    "profit > 1",                           # unknown column
+    "risk_level == 'Severe'",               # text other than a risk level
+    "revenue > True",
+    "revenue >",                            # syntax error
+])
+def test_rejected_syntax(expression):
+    with pytest.raises(ScreenExpressionError):
+        parse_expression(expression)
+
+def test_too_long():
+    with pytest.raises(ScreenExpressionError):
+        parse_expression("revenue > 1 and " * (SCREEN_MAX_EXPRESSION // 10) + "revenue > 1")
+
+def test_bare_function_name_is_rejected():
+    with pytest.raises(ScreenExpressionError):
+        run("abs > 1", columns(revenue=[1, 2, 3]))
+
+def test_condition_and_number_are_not_interchangeable():
+    data = columns(revenue=[1, 2, 3])
+    with pytest.raises(ScreenExpressionError):
+        run("(revenue > 1) + 1 > 0", data)
+    with pytest.raises(ScreenExpressionError):
+        run("revenue and revenue > 1", data)
+
+def test_comparisons_with_missing_values_are_false():
+    data = columns(debt_to_equity=[3, np.nan, 1])
+    assert run("debt_to_equity > 2", data).tolist() == [True, False, False]
+    assert run("not debt_to_equity > 2", data).tolist() == [False, True, True]
+    assert run("debt_to_equity != 1", data).tolist() == [True, True, False]
+
+def test_missing_function():
+    data = columns(total_debt=[np.nan, 5, np.nan])
+    assert run("missing(total_debt)", data).tolist() == [True, False, True]
+    assert run("missing(eps)", data).tolist() == [True, True, True]
+
+def test_arithmetic_propagates_missing_values():
+    data = columns(net_income=[10, np.nan, 5], revenue=[100, 50, 0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margin = run("net_income / revenue", data)
+    assert margin[0] == pytest.approx(0.1)
+    assert np.isnan(margin[1])
+    assert np.isinf(margin[2])
+
+def test_min_and_max_ignore_missing_values():
+    data = columns(revenue=[1, np.nan, np.nan], eps=[2, 3, np.nan])
+    assert run("max(revenue, eps)", data)[:2].tolist() == [2, 3]
+    assert np.isnan(run("min(revenue, eps)", data)[2])
+
+def test_risk_levels_compare_in_order():
+    data = columns()
+    assert run("risk_level >= 'medium'", data).tolist() == [False, True, False]
+    assert run("risk_level == 'Low' or missing(risk_level)", data).tolist() == [True, False, True]
+
+def test_chained_comparison():
+    data = columns(current_ratio=[0.5, 1.5, np.nan])
+    assert run("1 < current_ratio < 2", data).tolist() == [False, True, False]
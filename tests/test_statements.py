@@ -0,0 +1,66 @@
+"""Regression tests for statement table extraction (statements.py)"""
+import math
+
+from statements import extract_statements, parse_period_header, parse_row
+
+INCOME_STATEMENT = """CONSOLIDATED STATEMENTS OF OPERATIONS (in millions)
+Year Ended December 31, 2024 2023
+Total revenues 1,200 1,000
+Net income 150 120"""
+
+def test_header_with_dates_and_fiscal_terms():
+    assert parse_period_header("Year Ended December 31, 2024 2023") == ["2024", "2023"]
+    assert parse_period_header("Three Months Ended June 30, Q2 2025 Q2 2024") == ["Q2 2025", "Q2 2024"]
+    assert parse_period_header("(in millions) FY2024 FY2023") == ["2024", "2023"]
+
+def test_prose_and_schedules_are_not_headers():
+    assert parse_period_header("Our senior notes mature between 2029 and 2031.") is None
+    assert parse_period_header("Scheduled maturities of debt 2025 2026 2027 2028 2029") is None
+    assert parse_period_header("December 31, 2024 and 2023,") is None
+
+def test_debt_maturities_do_not_become_the_latest_period():
+    pages = [
+        """CONSOLIDATED BALANCE SHEETS
+December 31, 2024 2023
+Total debt 2,000 1,800
+Total stockholders' equity 1,000 900""",
+        """Note 7. Debt
+Our senior notes mature between 2029 and 2031.
+Scheduled maturities of debt
+2025 2026 2027 2028 2029
+Total debt 100 200 300 400 500""",
+    ]
+    statements = extract_statements(pages)
+    assert statements.periods == ["2024", "2023"]
+    assert statements.latest("total_debt") == ("2024", 2000.0)
+
+def test_unit_note_does_not_carry_into_the_next_table():
+    pages = [
+        INCOME_STATEMENT,
+        """SELECTED DATA
+Year Ended December 31, 2022 2021
+Total revenues 800 700""",
+    ]
+    statements = extract_statements(pages)
+    assert statements.reported("revenue") == [
+        ("2024", 1.2e9), ("2023", 1e9), ("2022", 800.0), ("2021", 700.0),
+    ]
+
+def test_unit_note_after_the_header_applies_to_its_table():
+    statements = extract_statements(["December 31, 2024 2023\n(in thousands)\nTotal assets 5,000 4,000"])
+    assert statements.latest("total_assets") == ("2024", 5e6)
+
+def test_footnote_marker_is_not_an_amount():
+    assert parse_row("Net income (1) 100 90", 2) == ("net_income", [100.0, 90.0])
+    statements = extract_statements(["December 31, 2024 2023\nNet income (1) 100 90"])
+    assert statements.latest("net_income") == ("2024", 100.0)
+
+def test_single_digit_negative_amounts_are_kept():
+    assert parse_row("Net loss (5) (3)", 2) == ("net_income", [-5.0, -3.0])
+
+def test_ratios_across_periods():
+    statements = extract_statements([INCOME_STATEMENT])
+    ratios = statements.ratios()
+    assert math.isclose(ratios["net_margin_pct"][0], 12.5)
+    assert math.isclose(ratios["revenue_growth_pct"][0], 20.0)
+    assert math.isnan(ratios["revenue_growth_pct"][1])
@@ -3,16 +3,35 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-from crewai_tools import SerperDevTool
-from langchain_community.document_loaders import PyPDFLoader
-import asyncio
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
-import re
 
-## Creating search tool
-search_tool = SerperDevTool()
+from retrieval import RETRIEVAL_TOP_K
+from telemetry import instrumented_tool
+# The document engine lives in documents.py (no crewai import); re-exported here for the tools' callers
+from documents import (
+    DOC_CACHE_MAX_BYTES, DOC_MAX_PAGES, RETRIEVAL_MAX_CHARS,
+    file_digest, ParsedDocument, ParsedDocumentCache, document_cache, chunk_indexes, document_index,
+    METRIC_PATTERNS, KEYWORD_GROUPS, MetricMatch, Extraction, ExtractionEngine, extraction_engine,
+    investment_insights, assess_risks, parse_number, normalized_metrics, CURRENCY_METRICS, METRIC_COLUMNS,
+)
+
+## Creating search tool lazily: SerperDevTool pulls in all of crewai_tools and no agent uses it
+_search_tool = None
+
+def get_search_tool():
+    global _search_tool
+    if _search_tool is None:
+        from crewai_tools import SerperDevTool
+        _search_tool = SerperDevTool()
+    return _search_tool
+
+def __getattr__(name):
+    # Keeps `from tools import search_tool` working without building it at import
+    if name == "search_tool":
+        return get_search_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 ## Creating custom pdf reader tool
 class FinancialDocumentInput(BaseModel):
@@ -24,6 +43,7 @@ class FinancialDocumentTool(BaseTool):
     description: str = "Tool to read and extract content from PDF financial documents. Always use the file_path from the task context."
     args_schema: Type[BaseModel] = FinancialDocumentInput
     
+    @instrumented_tool
     def _run(self, path: str = 'data/sample.pdf') -> str:
         """Tool to read data from a pdf file from a path
 
@@ -39,30 +59,78 @@ class FinancialDocumentTool(BaseTool):
             if not os.path.exists(path):
                 return f"Error: File not found at path: {path}"
                 
-            loader = PyPDFLoader(path)
-            docs = loader.load()
+            document = document_cache.get(path)
             
-            if not docs:
+            if not document.pages:
                 return f"Error: No content found in PDF at path: {path}"
-            
-            full_report = ""
-            for data in docs:
-                content = data.page_content
-                # Remove extra whitespaces and format properly
-                while "\n\n" in content:
-                    content = content.replace("\n\n", "\n")
-                full_report += content + "\n"
                 
-            return f"Financial document content from {path}:\n\n{full_report}"
+            return f"Financial document content from {path}:\n\n{document.normalized_text}"
         except Exception as e:
             return f"Error reading PDF from {path}: {str(e)}"
 
+## Creating query-scoped document search tool
+class DocumentSearchInput(BaseModel):
+    """Input schema for DocumentSearchTool."""
+    path: str = Field(description="Path to the PDF file to search", default="data/sample.pdf")
+    query: str = Field(description="The user's query or a focused sub-question, e.g. 'total debt and liquidity'", default="")
+    top_k: int = Field(description="Number of passages to return", default=RETRIEVAL_TOP_K)
+
+class DocumentSearchTool(BaseTool):
+    name: str = "Financial Document Search"
+    description: str = (
+        "Search a PDF financial document and return only the passages most relevant to a query, "
+        "labelled with page and section. Call it again with narrower sub-questions as needed. "
+        "Always use the file_path from the task context."
+    )
+    args_schema: Type[BaseModel] = DocumentSearchInput
+
+    @instrumented_tool
+    def _run(self, path: str = 'data/sample.pdf', query: str = "", top_k: int = RETRIEVAL_TOP_K) -> str:
+        """Return the passages of a pdf most relevant to query
+
+        Args:
+            path (str, optional): Path of the pdf file. Defaults to 'data/sample.pdf'.
+            query (str, optional): Question or keywords to rank passages by.
+            top_k (int, optional): Number of passages to return.
+
+        Returns:
+            str: Matching passages, best first, or an outline of the document's sections
+        """
+        try:
+            if not os.path.exists(path):
+                return f"Error: File not found at path: {path}"
+
+            index = document_index(path)
+            if not index.chunks:
+                return f"Error: No content found in PDF at path: {path}"
+
+            top_k = max(1, min(int(top_k), 20))
+            chunks = [chunk for _, chunk in index.search(query, top_k)]
+            if chunks:
+                header = f"Passages of {path} most relevant to '{query}':"
+            else:
+                chunks = index.overview(top_k)
+                header = f"No passages of {path} match '{query}'. Opening passages of its sections:"
+
+            parts = []
+            remaining = RETRIEVAL_MAX_CHARS
+            for chunk in chunks:
+                if remaining <= 0:
+                    break
+                text = chunk.text[:remaining]
+                remaining -= len(text)
+                parts.append(f"[Page {chunk.page} | {chunk.heading or 'Untitled section'}]\n{text}")
+            return header + "\n\n" + "\n\n".join(parts)
+        except Exception as e:
+            return f"Error searching PDF at {path}: {str(e)}"
+
 ## Creating Investment Analysis Tool - NOW TAKES FILE PATH
 class InvestmentTool(BaseTool):
     name: str = "Investment Analysis Tool"
     description: str = "Extract key investment metrics from a PDF file path. Reads the PDF first, then analyzes for investment insights."
     args_schema: Type[BaseModel] = FinancialDocumentInput  # Same schema as PDF tool
     
+    @instrumented_tool
     def _run(self, path: str = 'data/sample.pdf') -> str:
         """Analyze PDF file for investment insights
         
@@ -77,65 +145,13 @@ class InvestmentTool(BaseTool):
             if not os.path.exists(path):
                 return f"Error: File not found at path: {path}"
                 
-            loader = PyPDFLoader(path)
-            docs = loader.load()
+            document = document_cache.get(path)
             
-            if not docs:
+            if not document.pages:
                 return f"Error: No content found in PDF at path: {path}"
             
-            # Extract text content
-            text = ""
-            for data in docs:
-                text += data.page_content + "\n"
-            
             # Now analyze the text for investment metrics
-            insights = []
-            
-            # Extract revenue information
-            revenue_patterns = [
-                r'(?:total\s+)?revenues?\s*:?\s*\$?([\d,\.]+)\s*(?:billion|million|B|M)',
-                r'revenue\s+(?:of\s+)?\$?([\d,\.]+)\s*(?:billion|million|B|M)',
-                r'net\s+revenue\s*:?\s*\$?([\d,\.]+)'
-            ]
-            
-            for pattern in revenue_patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
-                    insights.append(f"Revenue: ${matches[0]}")
-                    break
-            
-            # Extract profit/income information
-            profit_patterns = [
-                r'(?:net\s+)?income\s*:?\s*\$?([\d,\.]+)\s*(?:billion|million|B|M)',
-                r'operating\s+income\s*:?\s*\$?([\d,\.]+)',
-                r'profit\s*:?\s*\$?([\d,\.]+)'
-            ]
-            
-            for pattern in profit_patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
-                    insights.append(f"Net Income: ${matches[0]}")
-                    break
-            
-            # Extract margin information
-            margin_matches = re.findall(r'(?:operating\s+|gross\s+)?margin\s*:?\s*([\d\.]+)%', text, re.IGNORECASE)
-            if margin_matches:
-                insights.append(f"Margin: {margin_matches[0]}%")
-            
-            # Extract growth information
-            growth_matches = re.findall(r'(?:revenue\s+)?growth\s*:?\s*([+-]?[\d\.]+)%', text, re.IGNORECASE)
-            if growth_matches:
-                insights.append(f"Growth Rate: {growth_matches[0]}%")
-            
-            # Extract cash flow information
-            cash_flow_matches = re.findall(r'(?:free\s+)?cash\s+flow\s*:?\s*\$?([\d,\.]+)', text, re.IGNORECASE)
-            if cash_flow_matches:
-                insights.append(f"Cash Flow: ${cash_flow_matches[0]}")
-            
-            # Extract EPS information
-            eps_matches = re.findall(r'earnings\s+per\s+share\s*:?\s*\$?([\d\.]+)', text, re.IGNORECASE)
-            if eps_matches:
-                insights.append(f"EPS: ${eps_matches[0]}")
+            insights = investment_insights(extraction_engine.extract_document(document))
             
             if insights:
                 result = f"Investment Analysis from {path}:\n\n"
@@ -160,6 +176,7 @@ class RiskTool(BaseTool):
     description: str = "Identify and analyze financial risks from a PDF file path. Reads the PDF first, then analyzes for risk factors."
     args_schema: Type[BaseModel] = FinancialDocumentInput  # Same schema as PDF tool
     
+    @instrumented_tool
     def _run(self, path: str = 'data/sample.pdf') -> str:
         """Assess financial risks from PDF file
         
@@ -174,79 +191,13 @@ class RiskTool(BaseTool):
             if not os.path.exists(path):
                 return f"Error: File not found at path: {path}"
                 
-            loader = PyPDFLoader(path)
-            docs = loader.load()
+            document = document_cache.get(path)
             
-            if not docs:
+            if not document.pages:
                 return f"Error: No content found in PDF at path: {path}"
             
-            # Extract text content
-            text = ""
-            for data in docs:
-                text += data.page_content + "\n"
-            
             # Now analyze the text for risks
-            risks = []
-            risk_level = "Low"
-            
-            # Debt and leverage risks
-            debt_patterns = [
-                r'total\s+debt\s*:?\s*\$?([\d,\.]+)',
-                r'debt.to.equity\s*:?\s*([\d\.]+)',
-                r'leverage\s*:?\s*([\d\.]+)'
-            ]
-            
-            for pattern in debt_patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
-                    risks.append(f"Debt Exposure: {matches[0]}")
-                    risk_level = "Medium"
-                    break
-            
-            # Liquidity risks
-            liquidity_keywords = ['liquidity', 'cash shortage', 'working capital deficit', 'cash crunch']
-            for keyword in liquidity_keywords:
-                if keyword in text.lower():
-                    risks.append(f"Liquidity Risk: {keyword.title()} mentioned in document")
-                    risk_level = "High"
-                    break
-            
-            # Market and operational risks
-            risk_keywords = [
-                'market volatility', 'economic uncertainty', 'regulatory changes',
-                'competitive pressure', 'supply chain disruption', 'cybersecurity',
-                'inflation', 'interest rate', 'currency fluctuation'
-            ]
-            
-            found_risks = [keyword for keyword in risk_keywords if keyword in text.lower()]
-            if found_risks:
-                risks.append(f"Market/Operational Risks: {', '.join(found_risks)}")
-                if len(found_risks) > 2:
-                    risk_level = "High"
-                elif risk_level == "Low":
-                    risk_level = "Medium"
-            
-            # Declining metrics
-            decline_patterns = [
-                r'(?:revenue\s+)?decreas(?:ed?|ing)\s+(?:by\s+)?([\d\.]+)%',
-                r'(?:profit\s+)?drop(?:ped?|ping)\s+(?:by\s+)?([\d\.]+)%',
-                r'down\s+([\d\.]+)%'
-            ]
-            
-            for pattern in decline_patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
-                    risks.append(f"Performance Decline: {matches[0]}% decrease noted")
-                    if float(matches[0]) > 10:
-                        risk_level = "High"
-                    elif risk_level == "Low":
-                        risk_level = "Medium"
-                    break
-            
-            # Credit rating mentions
-            if any(word in text.lower() for word in ['downgrade', 'credit rating', 'default risk']):
-                risks.append("Credit Risk: Rating or default concerns mentioned")
-                risk_level = "High"
+            risks, risk_level = assess_risks(extraction_engine.extract_document(document))
             
             if risks:
                 result = f"Risk Assessment from {path} - Overall Risk Level: {risk_level}\n\n"